@@ -65,5 +65,11 @@ setup(
         'Sphinx>=2.0.0',
         'docpath>=0.1.1',
     ],
+    entry_points={
+        'console_scripts': [
+            'sphinx-inherit-build = sphinxcontrib.inherit.multibuild:main',
+            'sphinx-inherit-watch = sphinxcontrib.inherit.watch:main',
+        ],
+    },
     zip_safe=False,
 )
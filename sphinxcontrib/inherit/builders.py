@@ -0,0 +1,189 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import json
+
+from hashlib import sha1
+from os import path
+from sphinx.builders import Builder
+from sphinx.errors import SphinxError
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+
+from .engine import inherit_keys, unapplied_inherit_nodes
+from .nodes import is_docname_pattern, update_structure_hash
+
+logger = logging.getLogger(__name__)
+
+
+class InheritCheckError(SphinxError):
+    category = 'Inherit check failed'
+
+
+class InheritCheckBuilder(Builder):
+    "Read the documents and resolve the inherits without writing any output"
+    name = 'inherit-check'
+    epilog = "Look for any inherit problems in %(outdir)s/inherit-check.json."
+
+    def get_outdated_docs(self):
+        return self.env.found_docs
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write(self, *ignored):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def finish(self):
+        problems = []
+        for docname in sorted(getattr(self.env, 'inherit_problems', {})):
+            problems += self.env.inherit_problems[docname]
+        for node in unapplied_inherit_nodes(self.env):
+            problems.append(unresolved_problem(node))
+
+        ensuredir(self.outdir)
+        filename = path.join(self.outdir, 'inherit-check.json')
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump({'problems': problems}, file, indent=2, sort_keys=True)
+
+        if problems:
+            logger.info("found {} inherit problems".format(len(problems)))
+
+    def check_doctree(self, app, doctree):
+        docname = self.env.docname
+        applied_nodes = self.env.inherit_applied.get(docname, set())
+        for key in inherit_keys(self.env, docname):
+            # Inherits for a pattern only need to be applied to one of the
+            # documents it matches, which the consistency check makes sure of
+            if is_docname_pattern(key[0]):
+                continue
+            for source_docname, node in self.env.inherit_nodes[key]:
+                if node.in_scope(docname) and node not in applied_nodes:
+                    self.fail(node)
+
+    def check_consistency(self, app, env):
+        for node in unapplied_inherit_nodes(env):
+            self.fail(node)
+
+    @staticmethod
+    def fail(node):
+        raise InheritCheckError(
+            "inherit from {}:{} not applied - target '{}' not found".format(
+                *node.inherit_source, node['target']))
+
+
+def unresolved_problem(node):
+    return {
+        'message': "target '{}' not found".format(node['target']),
+        'source': node['source'],
+        'target': node['target'],
+        'type': 'unresolved',
+        }
+
+
+def check_fail_fast(app):
+    "Stop the inherit-check builder at the first inherit problem"
+    builder = app.builder
+    if builder.name != 'inherit-check':
+        return
+    if app.config.inherit_check_fail_fast:
+        app.connect('doctree-read', builder.check_doctree)
+        app.connect('env-check-consistency', builder.check_consistency)
+
+
+def skip_written_documents(app):
+    """
+    Stop the builder writing documents that only contained inherits, and
+    those that were read again without their doctree changing
+    """
+    config = app.config
+    if not (config.inherit_skip_fragment_documents or
+            config.inherit_skip_unchanged_documents):
+        return
+
+    # Sphinx's events cannot remove documents from those written, so the
+    # builder's methods are wrapped, only once
+    builder = app.builder
+    if getattr(builder, 'inherit_skips_documents', False):
+        return
+    builder.inherit_skips_documents = True
+    get_outdated_docs = builder.get_outdated_docs
+    write = builder.write
+
+    def is_fragment(docname):
+        return (
+            config.inherit_skip_fragment_documents and
+            docname in getattr(app.env, 'inherit_fragments', set()))
+
+    def get_outdated_non_fragment_docs():
+        outdated_docs = get_outdated_docs()
+        if isinstance(outdated_docs, str):
+            return outdated_docs
+        return [d for d in outdated_docs if not is_fragment(d)]
+
+    def write_needed_docs(build_docnames, updated_docnames, method='update'):
+        if config.inherit_skip_fragment_documents:
+            if build_docnames is None or build_docnames == ['__all__']:
+                build_docnames = app.env.found_docs
+            build_docnames = [d for d in build_docnames if not is_fragment(d)]
+        unchanged = set()
+        if config.inherit_skip_unchanged_documents:
+            unchanged = getattr(app.env, 'inherit_unchanged_docnames', set())
+        write(
+            build_docnames,
+            [d for d in updated_docnames
+             if not is_fragment(d) and d not in unchanged],
+            method)
+
+    builder.get_outdated_docs = get_outdated_non_fragment_docs
+    builder.write = write_needed_docs
+
+
+def start_reading(app, env, docnames):
+    env.inherit_unchanged_docnames = set()
+
+
+def note_doctree_hash(app, doctree):
+    "Note whether the document is unchanged since it was last read"
+    env = app.env
+    if not getattr(env, 'inherit_doctree_hashes', None):
+        env.inherit_doctree_hashes = {}
+
+    docname = env.docname
+    doctree_hash = update_structure_hash(sha1(), [doctree]).hexdigest()
+    if env.inherit_doctree_hashes.get(docname, None) == doctree_hash:
+        env.inherit_unchanged_docnames.add(docname)
+    env.inherit_doctree_hashes[docname] = doctree_hash
+
+
+def forget_removed_hashes(app, env, added, changed, removed):
+    for docname in removed:
+        getattr(env, 'inherit_doctree_hashes', {}).pop(docname, None)
+    return []
+
+
+def skip_unchanged_documents(app):
+    """
+    Note which documents gave the same doctree as before when they were read
+    again, so the builder can skip writing them
+    """
+    if not app.config.inherit_skip_unchanged_documents:
+        return
+
+    app.connect('env-before-read-docs', start_reading)
+    app.connect('doctree-read', note_doctree_hash)
+    app.connect('env-get-outdated', forget_removed_hashes)
+
+
+def add_builders(app):
+    app.add_builder(InheritCheckBuilder)
+
+    app.connect('builder-inited', check_fail_fast)
+    app.connect('builder-inited', skip_written_documents)
+    app.connect('builder-inited', skip_unchanged_documents)
@@ -0,0 +1,138 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import csv
+import pickle
+
+from collections import defaultdict
+from os import path
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+from time import perf_counter
+
+from .nodes import iter_tree
+from .path import Path, path_module
+
+logger = logging.getLogger(__name__)
+
+columns = [
+    'module', 'documents', 'read_seconds', 'extract_seconds',
+    'apply_seconds', 'fragments', 'fragment_nodes', 'fragment_bytes',
+    'targets']
+
+
+def costs_enabled(env):
+    return env.config.inherit_cost_report
+
+
+def document_costs(env, docname):
+    if not getattr(env, 'inherit_costs', None):
+        env.inherit_costs = {}
+    return env.inherit_costs.setdefault(docname, {
+        'read': 0.0,
+        'extract': 0.0,
+        'apply': defaultdict(float),
+        'fragments': 0,
+        'fragment_nodes': 0,
+        'fragment_bytes': 0,
+        })
+
+
+def note_extract_cost(env, docname, seconds):
+    document_costs(env, docname)['extract'] += seconds
+
+
+def note_fragment_cost(env, docname, node):
+    costs = document_costs(env, docname)
+    costs['fragments'] += 1
+    costs['fragment_nodes'] += sum(1 for c in node for n in iter_tree(c))
+    costs['fragment_bytes'] += len(
+        pickle.dumps(node.children, pickle.HIGHEST_PROTOCOL))
+
+
+def note_apply_cost(env, docname, source_docname, seconds):
+    document_costs(env, docname)['apply'][source_docname] += seconds
+
+
+def start_read(app, docname, source):
+    if costs_enabled(app.env):
+        app.env.temp_data['inherit_read_start'] = perf_counter()
+
+
+def finish_read(app, doctree):
+    start = app.env.temp_data.get('inherit_read_start', None)
+    if start is not None:
+        document_costs(app.env, app.env.docname)['read'] += (
+            perf_counter() - start)
+
+
+def purge_costs(app, env, docname):
+    if getattr(env, 'inherit_costs', None):
+        env.inherit_costs.pop(docname, None)
+
+
+def merge_costs(app, env, docnames, other):
+    if getattr(other, 'inherit_costs', None):
+        for docname in docnames:
+            if docname in other.inherit_costs:
+                document_costs(env, docname).update(
+                    other.inherit_costs[docname])
+
+
+def get_module_costs(app, env):
+    "Total the costs of the documents for each module"
+    modules_dir = Path(env.srcdir) / app.config.inherit_modules_dir
+    modules = list(app.config.inherit_modules)
+
+    module_costs = {}
+    for module in modules + [None]:
+        module_costs[module] = dict.fromkeys(columns, 0)
+        module_costs[module]['module'] = module or ''
+        module_costs[module]['targets'] = set()
+
+    def costs_of_module(docname):
+        module = path_module(modules_dir, modules, env.doc2path(docname))
+        return module_costs[module]
+
+    for docname, costs in getattr(env, 'inherit_costs', {}).items():
+        module = costs_of_module(docname)
+        module['documents'] += 1
+        module['read_seconds'] += costs['read']
+        module['extract_seconds'] += costs['extract']
+        for column in ['fragments', 'fragment_nodes', 'fragment_bytes']:
+            module[column] += costs[column]
+
+        for source_docname, seconds in costs['apply'].items():
+            source_module = costs_of_module(source_docname)
+            source_module['apply_seconds'] += seconds
+            source_module['targets'].add(docname)
+
+    for module in module_costs.values():
+        module['targets'] = len(module['targets'])
+    return sorted(
+        module_costs.values(),
+        key=lambda m: m['read_seconds'] + m['apply_seconds'], reverse=True)
+
+
+def write_cost_report(app, exception):
+    if exception is not None or not costs_enabled(app.env):
+        return
+
+    ensuredir(app.outdir)
+    filename = path.join(app.outdir, 'inherit-costs.csv')
+    with open(filename, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        for module in get_module_costs(app, app.env):
+            writer.writerow({
+                k: round(v, 6) if isinstance(v, float) else v
+                for k, v in module.items()})
+    logger.info("inherit costs written to {}".format(filename))
+
+
+def add_costs(app):
+    app.connect('source-read', start_read)
+    app.connect('doctree-read', finish_read)
+    app.connect('env-purge-doc', purge_costs)
+    app.connect('env-merge-info', merge_costs)
+    app.connect('build-finished', write_cost_report)
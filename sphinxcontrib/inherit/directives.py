@@ -2,7 +2,9 @@
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
 from docpath import path as docpath
-from docutils.parsers.rst.directives import nonnegative_int
+from docutils.parsers.rst import Directive
+from docutils.parsers.rst.directives import (
+    flag, nonnegative_int, unchanged_required)
 from sphinx.util.docutils import SphinxDirective
 
 from .nodes import inherit
@@ -28,6 +30,10 @@ def docpath_path(argument):
     return argument
 
 
+def docname_patterns(argument):
+    return unchanged_required(argument).split()
+
+
 def int_or_end(argument):
     if argument == 'end':
         return None
@@ -40,27 +46,43 @@ def nonnegative_int_or_all(argument):
     return nonnegative_int(argument)
 
 
-class Inherit(SphinxDirective):
+class InheritDirective(Directive):
+    "The inherit directive for documents that are read without Sphinx"
     required_arguments = 2
     final_argument_whitespace = True
     option_spec = {
+        'every': flag,
         'filter': docpath_path,
         'index': int_or_end,
         'quantity':  nonnegative_int_or_all,
+        'scope': docname_patterns,
     }
 
     def run(self):
         position = self.arguments[0]
         quantity = _get_quantity(position, self.options.get('quantity', None))
         return [inherit(
+            every='every' in self.options,
             filter=self.options.get('filter', []),
             index=self.options.get('index', None),
             position=position,
             required_quantity=quantity,
-            source='{}:{}'.format(self.env.docname, self.lineno),
+            scope=self.options.get('scope', []),
+            source='{}:{}'.format(self.docname, self.lineno),
             target=self.arguments[1],
             )]
 
+    @property
+    def docname(self):
+        return self.state.document.settings.inherit_docname
+
+
+class Inherit(InheritDirective, SphinxDirective):
+
+    @property
+    def docname(self):
+        return self.env.docname
+
 
 def add_directives(app):
     app.add_directive('inherit', Inherit)
@@ -0,0 +1,987 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import logging
+
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from docpath import path as docpath
+from docutils import nodes
+from docutils.core import publish_doctree
+from docutils.parsers.rst import directives
+from docutils.readers import standalone
+from docutils.transforms import Transform
+from hashlib import sha1
+from heapq import heapify, heappop, heappush
+from itertools import chain
+from operator import itemgetter
+from os import path
+from pathlib import Path
+from sphinx.util.docutils import docutils_namespace
+from time import perf_counter
+
+from .directives import InheritDirective
+from .nodes import (
+    detach_from_document, docname_matcher, has_inherit_ancestor,
+    inherit_hidden, insert_nodes, in_document, is_docname_pattern,
+    is_indirect_target, is_nested, iter_tree, move_to_before, node_at,
+    node_location, remove_from, remove_node, update_structure_hash)
+from .path import path_module, path_subdir_contains
+from .query import (
+    DocumentIndex, LabelQuery, compile_query, following_element,
+    next_node_after_any_target_nodes, next_sibling_element, provided_features)
+from .scanner import hidden_document, scan_lines
+
+logger = logging.getLogger(__name__)
+
+PublishResult = namedtuple('PublishResult', 'doctrees problems unapplied')
+
+
+def warn_at(message, location):
+    logger.warning('%s:%s: %s', *location, message)
+
+
+class InheritState:
+    "The inherits extracted from, and applied to, a set of documents"
+
+    def __init__(self):
+        init_state(self)
+
+
+def init_state(state):
+    "Add the attributes the engine keeps its state in, if they are missing"
+    if not getattr(state, 'inherit_nodes', None):
+        state.inherit_nodes = defaultdict(list)
+        state.inherit_target_keys = defaultdict(dict)
+        # Keys that target a label in any document are only offered to the
+        # documents with that label, or that inherit it from another key
+        state.inherit_label_keys = defaultdict(dict)
+        state.inherit_key_labels = defaultdict(Counter)
+        state.inherit_source_keys = defaultdict(set)
+        # How many documents each stored inherit node is applied to, kept up
+        # to date as documents are read and purged
+        state.inherit_applied_counts = {}
+        state.inherit_unapplied = set()
+        # The keys whose inherits add nodes with each feature that index and
+        # label queries look for
+        state.inherit_providers = defaultdict(Counter)
+        state.inherit_source_features = defaultdict(list)
+        # The stored inherit nodes, by key, that each docpath target that has
+        # been looked up matches in, kept up to date as nodes are stored
+        state.inherit_docpath_matches = {}
+    if not getattr(state, 'inherit_target_patterns', None):
+        state.inherit_target_patterns = set()
+    if not getattr(state, 'inherit_applied', None):
+        state.inherit_applied = defaultdict(set)
+    if not getattr(state, 'inherit_problems', None):
+        state.inherit_problems = defaultdict(list)
+    if not getattr(state, 'inherit_fragments', None):
+        state.inherit_fragments = set()
+    if not getattr(state, 'inherit_labels', None):
+        state.inherit_labels = {}
+        state.inherit_document_labels = defaultdict(set)
+    if not getattr(state, 'inherit_locations', None):
+        state.inherit_locations = {}
+
+
+class InheritEngine:
+    """
+    Extract the inherits from doctrees and apply them to other doctrees,
+    keeping what has been extracted and applied in the state
+    """
+
+    def __init__(
+            self, state=None, prune_hidden=False, release_dir=None,
+            cache_locations=False, warn=warn_at):
+        self.state = InheritState() if state is None else state
+        init_state(self.state)
+        self.prune_hidden = prune_hidden
+        self.release_dir = release_dir
+        self.cache_locations = cache_locations
+        self.warn = warn
+
+    def note_problem(self, problem_type, node, message):
+        "Warn about and record a problem with an inherit node"
+        self.warn(message, node.inherit_source)
+        self.state.inherit_problems[node.inherit_source[0]].append({
+            'message': message,
+            'source': node['source'],
+            'target': node['target'],
+            'type': problem_type,
+            })
+
+    def reposition(self, document):
+        "Make inherit nodes the parent of the nodes they inherit"
+        for node in docpath('//inherit').findall(document):
+            if not node.get('required_quantity', 0):
+                continue
+
+            next_node = following_element(node)
+            if not next_node:
+                self._remove_node(
+                    node, 'quantity', "inherit requires a node to inherit")
+                continue
+
+            if node.parent != next_node.parent:
+                move_to_before(node, next_node)
+
+            if has_inherit_ancestor(node):
+                self._remove_node(
+                    node, 'nesting', "nested inherits are not allowed")
+                continue
+
+            siblings = node.parent.children
+            index = node.parent.index(node)
+            count = node.inherit_required_quantity
+            while count != 0 and next_node:
+                remove_node(next_node)
+                node.append(next_node)
+
+                next_node = next_sibling_element(siblings, index)
+                if count > 0:
+                    count -= 1
+
+    def _remove_node(self, node, problem_type, warning):
+        remove_node(node)
+        self.note_problem(problem_type, node, warning)
+
+    def take_inherits(self, document, docname):
+        "Remove the inherit nodes from the document and return them"
+        inherit_nodes = []
+        for node in docpath('//inherit').findall(document):
+            nested = is_nested(node)
+            forget_nodes(document, docpath('.//*').findall(node))
+            remove_node(node)
+
+            if node['target'].startswith('document:'):
+                # Documents are hidden before they are read, only by the hides
+                # that are not nested in other markup
+                if node.inherit_position != 'hide':
+                    self.note_problem(
+                        'position', node, "documents can only be hidden")
+                elif nested:
+                    self.note_problem(
+                        'nesting', node,
+                        "document-level hides must not be nested")
+                continue
+
+            if not node.has_required_number_of_children():
+                self.note_problem(
+                    'quantity', node,
+                    "inherit captured {} nodes instead of {}".format(
+                        len(node.children), node.inherit_required_quantity))
+            if node.children_required_but_missing():
+                continue
+
+            node.apply_filter()
+            detach_from_document(node)
+            inherit_nodes.append(node)
+
+        if len(document.children) == 0:
+            self.state.inherit_fragments.add(docname)
+
+        return inherit_nodes
+
+    def store(self, docname, inherit_nodes):
+        "Store the inherit nodes taken from the document"
+        index = defaultdict(int)
+        for node in inherit_nodes:
+            key = node.inherit_target + (node.inherit_position,)
+            self.store_node(key, index[key], docname, node)
+            index[key] += 1
+
+    def store_node(self, key, index, docname, node):
+        state = self.state
+        if key not in state.inherit_nodes:
+            # Keys are never removed, so their count gives their order
+            order = len(state.inherit_nodes)
+            label = target_label(key)
+            if label is not None:
+                state.inherit_label_keys[label][key] = order
+            else:
+                state.inherit_target_keys[key[0]][key] = order
+            if is_docname_pattern(key[0]):
+                state.inherit_target_patterns.add(key[0])
+
+        state.inherit_nodes[key].insert(index, (docname, node))
+        state.inherit_source_keys[docname].add(key)
+        state.inherit_applied_counts[node] = 0
+        state.inherit_unapplied.add(node)
+        for feature in provided_features(node):
+            state.inherit_providers[feature][key] += 1
+            state.inherit_source_features[docname].append((feature, key))
+            if feature[0] == 'label':
+                state.inherit_key_labels[key][feature[1]] += 1
+        for path, matches in state.inherit_docpath_matches.items():
+            if compile_query(path).matches_in(node):
+                matches[key].add(node)
+
+    def extract(self, document, docname):
+        "Extract and store the document's inherit nodes, and return them"
+        inherit_nodes = self.take_inherits(document, docname)
+        self.store(docname, inherit_nodes)
+        return inherit_nodes
+
+    def apply(self, document, docname, note_applied=None):
+        """
+        Apply the stored inherit nodes that target the document to it, calling
+        note_applied with each inherit node and the seconds it took to apply
+        """
+        application = InheritApplication(self, document, docname)
+        for inherit_node, seconds in application.apply():
+            self.note_applied(docname, inherit_node)
+            if note_applied:
+                note_applied(inherit_node, seconds)
+
+        self.note_labels(document, docname)
+
+    def note_applied(self, docname, inherit_node):
+        state = self.state
+        if inherit_node in state.inherit_applied[docname]:
+            return
+        state.inherit_applied[docname].add(inherit_node)
+        state.inherit_applied_counts[inherit_node] += 1
+        state.inherit_unapplied.discard(inherit_node)
+
+    def note_labels(self, document, docname):
+        for name in document_labels(document):
+            self.state.inherit_labels[name] = docname
+            self.state.inherit_document_labels[docname].add(name)
+
+    def merge_toctrees(self, document):
+        "Merge inherited toctree nodes with existing toctree nodes"
+        for toctree in docpath('//toctree').findall(document):
+            for node in docpath('following_sibling::toctree').findall(toctree):
+                merge_toctree(toctree, node)
+                remove_node(node)
+
+    def purge(self, docname):
+        "Forget everything extracted from, and applied to, the document"
+        state = self.state
+        for key in state.inherit_source_keys.pop(docname, set()):
+            for d, n in state.inherit_nodes[key]:
+                if d == docname:
+                    n.discard()
+                    state.inherit_applied_counts.pop(n, None)
+                    state.inherit_unapplied.discard(n)
+                    for matches in state.inherit_docpath_matches.values():
+                        if key in matches:
+                            matches[key].discard(n)
+            state.inherit_nodes[key] = [
+                (d, n) for d, n in state.inherit_nodes[key] if d != docname]
+
+        for node in state.inherit_applied.pop(docname, set()):
+            # Nodes from the document itself have already been forgotten
+            if node not in state.inherit_applied_counts:
+                continue
+            state.inherit_applied_counts[node] -= 1
+            if state.inherit_applied_counts[node] == 0:
+                state.inherit_unapplied.add(node)
+
+        for feature, key in state.inherit_source_features.pop(docname, []):
+            providers = state.inherit_providers[feature]
+            providers[key] -= 1
+            if providers[key] == 0:
+                del providers[key]
+            if feature[0] == 'label':
+                labels = state.inherit_key_labels[key]
+                labels[feature[1]] -= 1
+                if labels[feature[1]] == 0:
+                    del labels[feature[1]]
+
+        state.inherit_problems.pop(docname, None)
+        state.inherit_fragments.discard(docname)
+
+        for name in state.inherit_document_labels.pop(docname, set()):
+            if state.inherit_labels.get(name, None) == docname:
+                del state.inherit_labels[name]
+
+    def forget_locations(self, docname):
+        "Forget the target locations found in a document that was removed"
+        self.state.inherit_locations.pop(docname, None)
+
+    def unapplied_nodes(self):
+        return unapplied_inherit_nodes(self.state)
+
+
+class TargetLocations:
+    """
+    The locations of the nodes that were found, or not found, for each target
+    path the last time a document was read. They are keyed on a hash of the
+    structure of the document as it was read and of each inherit that had been
+    applied to it before the target was looked for.
+    """
+
+    def __init__(self, previous, document):
+        self.previous = previous or {}
+        self.found = {}
+        self.document = document
+        self.hash = update_structure_hash(sha1(), [document])
+
+    def find(self, query, path, index):
+        if isinstance(query, LabelQuery):
+            return query.find(index)
+
+        key = (self.hash.hexdigest(), path)
+        if key in self.previous:
+            location = self.previous[key]
+            node = None
+            if location is not None:
+                node = node_at(self.document, location)
+        else:
+            node = query.find(index)
+            location = node_location(node) if node is not None else None
+        self.found[key] = location
+        return node
+
+    def note_applied(self, inherit_node, inherited_nodes):
+        self.hash.update('\0I{}\0{}\0{}'.format(
+            inherit_node['source'], inherit_node['position'],
+            inherit_node['target']).encode('utf-8'))
+        update_structure_hash(self.hash, inherited_nodes)
+
+
+class InheritApplication:
+    "The application of the stored inherit nodes to a document"
+
+    def __init__(self, engine, document, docname):
+        self.engine = engine
+        self.document = document
+        self.docname = docname
+
+    def apply(self):
+        "Apply each inherit node, yielding it and the seconds it took"
+        state = self.engine.state
+        self.locations = None
+        for target_node, inherit_node, position in self._get_inheritance():
+            start = perf_counter()
+            apply_inheritance = getattr(self, '_apply_{}'.format(position))
+            inherited_nodes = self._instantiate(inherit_node)
+            apply_inheritance(target_node, inherit_node, inherited_nodes)
+            if self.locations is not None:
+                self.locations.note_applied(inherit_node, inherited_nodes)
+            yield inherit_node, perf_counter() - start
+
+        if self.locations is not None:
+            state.inherit_locations[self.docname] = self.locations.found
+        else:
+            state.inherit_locations.pop(self.docname, None)
+
+    def _instantiate(self, inherit_node):
+        """
+        Move the nodes of an inherit that is only applied once, to this
+        document, when they can be released, so they are not copied, otherwise
+        clone them
+        """
+        release_dir = self.engine.release_dir
+        target_docname = inherit_node.inherit_target[0]
+        if (release_dir and target_docname and inherit_node.children and
+                not is_docname_pattern(target_docname) and
+                not inherit_node.inherit_every):
+            return inherit_node.release(
+                fragment_filename(release_dir, inherit_node))
+        return inherit_node.instantiate()
+
+    def _get_inheritance(self):
+        state = self.engine.state
+        parts_by_key = {}
+        for key in inherit_keys(
+                state, self.docname, None,
+                labels=document_labels(self.document)):
+            parts = [
+                p for p in state.inherit_nodes[key]
+                if p[1].in_scope(self.docname)]
+            if parts:
+                parts_by_key[key] = parts
+        if parts_by_key and self.engine.cache_locations:
+            # The document is only hashed when it has targets to look for
+            self.locations = TargetLocations(
+                state.inherit_locations.get(self.docname, None),
+                self.document)
+        self.index = DocumentIndex(
+            self.document,
+            [compile_query(path) for _, path, _ in parts_by_key])
+
+        keys, cyclic = self._dependency_order(parts_by_key)
+        for key in keys:
+            docname, path, position = key
+            query = compile_query(path)
+            parts = parts_by_key[key]
+            target_node = self._find(query, path)
+            if target_node is None and key in cyclic:
+                for source_docname, inherit_node in parts:
+                    self.engine.warn(
+                        "inherit target '{}' depends on a cycle of "
+                        "inherits".format(inherit_node['target']),
+                        inherit_node.inherit_source)
+            # Every match is found before any part is applied, so the nodes
+            # the parts add are never targets themselves
+            target_nodes = None
+            if target_node is not None and any(
+                    n.inherit_every for _, n in parts):
+                target_nodes = query.find_all(self.index)
+            self.index.done(query)
+            if target_node is None:
+                continue
+
+            for source_docname, inherit_node in parts:
+                if not inherit_node.inherit_every:
+                    yield (target_node, inherit_node, position)
+                    continue
+                for node in target_nodes:
+                    # Earlier parts may have pruned the node from the document
+                    if in_document(node, self.document):
+                        yield (node, inherit_node, position)
+
+    def _dependency_order(self, parts_by_key):
+        """
+        Order the keys so that inherits whose targets can be added by the
+        inherits of other keys are applied after them, and get the keys that
+        are left in or after a cycle
+        """
+        keys = list(parts_by_key)
+        if len(keys) < 2:
+            return keys, set()
+
+        ordered, cyclic = dependency_order(
+            keys, fragment_dependencies(self.engine.state, parts_by_key))
+        return ordered, set(cyclic)
+
+    def _find(self, query, path):
+        if self.locations is not None:
+            return self.locations.find(query, path, self.index)
+        return query.find(self.index)
+
+    def _next_node_after_any_target_nodes(self, from_node):
+        return next_node_after_any_target_nodes(from_node)
+
+    def _apply_after(self, target_node, inherit_node, inherited_nodes):
+        target_node = self._next_node_after_any_target_nodes(target_node)
+        index = target_node.parent.index(target_node)
+        insert_nodes(target_node.parent, index+1, inherited_nodes)
+        self._register_nodes(inherited_nodes)
+
+    def _apply_before(self, target_node, inherit_node, inherited_nodes):
+        index = target_node.parent.index(target_node)
+        insert_nodes(target_node.parent, index, inherited_nodes)
+        self._register_nodes(inherited_nodes)
+
+    def _apply_inside(self, target_node, inherit_node, inherited_nodes):
+        target_node = self._next_node_after_any_target_nodes(target_node)
+        if inherit_node.inherit_index is None:
+            target_node.extend(inherited_nodes)
+        else:
+            insert_nodes(
+                target_node, inherit_node.inherit_index, inherited_nodes)
+        self._register_nodes(inherited_nodes)
+
+    def _apply_hide(self, target_node, inherit_node, inherited_nodes):
+        assert len(inherited_nodes) == 0
+        target_node = self._next_node_after_any_target_nodes(target_node)
+
+        if self.engine.prune_hidden:
+            self.index.note_changed([target_node])
+            forget_nodes(self.document, iter_tree(target_node))
+            remove_node(target_node)
+            return
+
+        self.index.note_changed([target_node])
+        index = target_node.parent.index(target_node)
+        hidden_node = inherit_hidden(source=inherit_node['source'])
+        target_node.parent.insert(index, hidden_node)
+
+        self._register_nodes([hidden_node])
+
+        remove_node(target_node)
+        hidden_node.append(target_node)
+
+    def _register_nodes(self, nodes):
+        self.index.note_changed(nodes)
+        for node in chain(*[iter_tree(n) for n in nodes]):
+            node.document = self.document
+            node_type = node.__class__.__name__
+            note = getattr(self, '_note_{}'.format(node_type), None)
+            if note:
+                note(node)
+
+    def _note_citation(self, node):
+        self.document.note_citation(node)
+        self.document.note_explicit_target(node, node)
+
+    def _note_citation_reference(self, node):
+        self.document.note_citation_ref(node)
+
+    def _note_footnote(self, node):
+        auto = str(node.get('auto', None))
+        if auto == '1':
+            self.document.note_autofootnote(node)
+        elif auto == '*':
+            self.document.note_symbol_footnote(node)
+        else:
+            self.document.note_footnote(node)
+
+        if node.get('names', None):
+            self.document.note_explicit_target(node, node)
+
+    def _note_footnote_reference(self, node):
+        auto = str(node.get('auto', None))
+        if auto == '1':
+            self.document.note_autofootnote_ref(node)
+        elif auto == '*':
+            self.document.note_symbol_footnote_ref(node)
+        if node.get('refname', None):
+            self.document.note_footnote_ref(node)
+
+    def _note_reference(self, node):
+        if node.get('refname', None):
+            self.document.note_refname(node)
+
+    def _note_section(self, node):
+        self.document.note_implicit_target(node, node)
+
+    def _note_substitution_definition(self, node):
+        self.document.note_substitution_def(node, node['names'][0])
+
+    def _note_substitution_reference(self, node):
+        self.document.note_substitution_ref(node, node.astext())
+
+    def _note_target(self, node):
+        if node.get('refname', None):
+            self.document.note_indirect_target(node)
+        elif node.get('names'):
+            self.document.note_explicit_target(node, node)
+        else:
+            self.document.note_anonymous_target(node)
+
+
+def forget_nodes(document, document_nodes):
+    "Remove the document's references to the nodes and clear their ids"
+    for node in document_nodes:
+        if not isinstance(node, nodes.Element):
+            continue
+
+        # Note: refid should be empty as only later transforms populate it
+
+        for id in node.get('ids', []):
+            document.ids.pop(id, None)
+        node['ids'] = []
+
+        for name in node.get('names', []):
+            document.nameids.pop(name, None)
+            document.nametypes.pop(name, None)
+            document.refnames.pop(name, None)
+
+            document.substitution_defs.pop(name, None)
+            document.substitution_names.pop(name, None)
+
+            document.footnote_refs.pop(name, None)
+            document.citation_refs.pop(name, None)
+
+        if is_indirect_target(node):
+            remove_from(node, document.indirect_targets)
+
+        if isinstance(node, nodes.footnote):
+            remove_from(node, document.footnotes)
+            remove_from(node, document.autofootnotes)
+            remove_from(node, document.symbol_footnotes)
+
+        if isinstance(node, nodes.footnote_reference):
+            remove_from(node, document.autofootnote_refs)
+            remove_from(node, document.symbol_footnote_refs)
+
+        if isinstance(node, nodes.citation):
+            remove_from(node, document.citations)
+
+
+def merge_toctree(toctree, other):
+    index = other.get('inherit_index', None)
+    for attribute in ['entries', 'includefiles']:
+        if index is None:
+            toctree[attribute] += other[attribute]
+        else:
+            toctree[attribute] = (
+                toctree[attribute][:index] +
+                other[attribute] +
+                toctree[attribute][index:])
+
+    attributes = [
+        'caption', 'glob', 'hidden', 'includehidden', 'maxdepth',
+        'numbered', 'titlesonly']
+    for attribute in attributes:
+        toctree[attribute] = other[attribute]
+
+
+def target_label(key):
+    "Get the label a key targets in any document, if it targets one"
+    if key[0] is None and key[1].startswith('label:'):
+        return compile_query(key[1]).label
+    return None
+
+
+def document_labels(document):
+    "Get the explicit target names defined in a document"
+    return [
+        name for name, explicit in document.nametypes.items()
+        if explicit and document.nameids.get(name, None)]
+
+
+def inherit_keys(state, *docnames, labels=()):
+    """
+    Get the keys of the inherit nodes that target the documents, or the
+    labels, in order, including the keys that target the labels that the
+    inherits of those keys add
+    """
+    target_keys = getattr(state, 'inherit_target_keys', {})
+    patterns = getattr(state, 'inherit_target_patterns', set())
+    label_keys = getattr(state, 'inherit_label_keys', {})
+    key_labels = getattr(state, 'inherit_key_labels', {})
+    docnames += tuple(sorted(
+        p for p in patterns
+        if any(docname_matcher((p,))(d) for d in docnames if d is not None)))
+    keys = dict(chain(*[target_keys.get(d, {}).items() for d in docnames]))
+
+    pending = list(labels) + list(chain(*[
+        key_labels.get(k, ()) for k in keys]))
+    seen = set()
+    while pending:
+        label = pending.pop()
+        if label in seen:
+            continue
+        seen.add(label)
+        for key, order in label_keys.get(label, {}).items():
+            if key not in keys:
+                keys[key] = order
+                pending += list(key_labels.get(key, ()))
+    return [k for k, _ in sorted(keys.items(), key=itemgetter(1))]
+
+
+def fragment_dependencies(state, parts_by_key):
+    """
+    Get the other keys whose inherits add nodes that each key's target
+    matches, looking up the keys that provide what index and label queries
+    look for, and the nodes that each docpath has been found to match in
+    """
+    dependencies = {}
+    for key in parts_by_key:
+        query = compile_query(key[1])
+        if query.feature is None:
+            providers = {
+                k for k, matched in docpath_matches(state, key[1]).items()
+                if k in parts_by_key and
+                any(n in matched for _, n in parts_by_key[k])}
+        else:
+            providers = set()
+            for feature in dependency_features(query):
+                keys = state.inherit_providers.get(feature, {})
+                if len(keys) > len(parts_by_key):
+                    providers |= {k for k in parts_by_key if k in keys}
+                else:
+                    providers |= {k for k in keys if k in parts_by_key}
+        providers.discard(key)
+        if providers:
+            dependencies[key] = providers
+    return dependencies
+
+
+def dependency_features(query):
+    """
+    Get the features of the nodes whose inherits a query's target depends on,
+    including the children that a target with a child type may be given
+    """
+    features = [query.feature]
+    if getattr(query, 'child_type', None) is not None:
+        features.append((query.child_type, None, None, None))
+    return features
+
+
+def docpath_matches(state, path):
+    """
+    Get the stored inherit nodes that a docpath matches in, by key, looking
+    through them all only the first time the docpath is looked up
+    """
+    matches = state.inherit_docpath_matches.get(path, None)
+    if matches is None:
+        query = compile_query(path)
+        matches = defaultdict(set)
+        for key, parts in state.inherit_nodes.items():
+            for docname, node in parts:
+                if query.matches_in(node):
+                    matches[key].add(node)
+        state.inherit_docpath_matches[path] = matches
+    return matches
+
+
+def dependency_order(keys, dependencies):
+    """
+    Sort the keys so each comes after the keys it depends on, otherwise
+    keeping their order, and return them with the keys left in or after a cycle
+    """
+    order = {k: i for i, k in enumerate(keys)}
+    dependents = defaultdict(list)
+    waiting = {}
+    for key, providers in dependencies.items():
+        waiting[key] = len(providers)
+        for provider in providers:
+            dependents[provider].append(key)
+
+    ready = [order[k] for k in keys if not waiting.get(k, 0)]
+    heapify(ready)
+    ordered = []
+    while ready:
+        key = keys[heappop(ready)]
+        ordered.append(key)
+        for dependent in dependents.get(key, []):
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heappush(ready, order[dependent])
+
+    cyclic = [k for k in keys if waiting.get(k, 0)]
+    return ordered + cyclic, cyclic
+
+
+def fragment_filename(directory, node):
+    "Get the file in the directory that an inherit's nodes are released to"
+    key = '{}\n{}\n{}'.format(
+        node['source'], node['position'], node['target'])
+    return path.join(
+        directory, sha1(key.encode('utf-8')).hexdigest() + '.pickle')
+
+
+def unapplied_inherit_nodes(state):
+    "Get the stored inherit nodes that have not been applied to any document"
+    return sorted(
+        getattr(state, 'inherit_unapplied', set()),
+        key=lambda n: (n.inherit_source[0], int(n.inherit_source[1])))
+
+
+def sort_by_module(docnames, modules, modules_dir, doc_path):
+    "Sort the documents so they are read in reverse module order"
+    modules = list(reversed(modules))
+    if not modules:
+        return list(docnames)
+
+    docname_modules = {
+        d: path_module(modules_dir, modules, doc_path(d)) for d in docnames}
+    sorted_docnames = []
+
+    # docnames in reverse order of their modules
+    sorted_docnames += [
+        d for m in modules for d in docnames if docname_modules[d] == m]
+
+    # docnames that aren't in any module
+    sorted_docnames += [
+        d for d in docnames
+        if not path_subdir_contains(modules_dir, doc_path(d))]
+
+    return sorted_docnames
+
+
+class EngineTransform(Transform):
+    "A docutils transform that uses the engine in the document's settings"
+
+    @property
+    def engine(self):
+        return self.document.settings.inherit_engine
+
+    @property
+    def docname(self):
+        return self.document.settings.inherit_docname
+
+
+class RepositionTransform(EngineTransform):
+    default_priority = 40
+
+    def apply(self, **kwargs):
+        self.engine.reposition(self.document)
+
+
+class ExtractTransform(EngineTransform):
+    default_priority = 50
+
+    def apply(self, **kwargs):
+        self.engine.extract(self.document, self.docname)
+
+
+class DiscardTransform(EngineTransform):
+    "Remove the inherit nodes, which have already been extracted"
+    default_priority = 50
+
+    def apply(self, **kwargs):
+        self.engine.take_inherits(self.document, self.docname)
+
+
+class ApplyTransform(EngineTransform):
+    default_priority = 60
+
+    def apply(self, **kwargs):
+        self.engine.apply(self.document, self.docname)
+
+
+class MergeToctreesTransform(EngineTransform):
+    default_priority = 70
+
+    def apply(self, **kwargs):
+        self.engine.merge_toctrees(self.document)
+
+
+class ExtractReader(standalone.Reader):
+    "A reader that only extracts the inherits from the document"
+
+    def get_transforms(self):
+        return [RepositionTransform, ExtractTransform]
+
+
+class ApplyReader(standalone.Reader):
+    "A reader that applies the inherits to the document as it is read"
+
+    def get_transforms(self):
+        return super().get_transforms() + [
+            RepositionTransform, DiscardTransform, ApplyTransform,
+            MergeToctreesTransform]
+
+
+def may_contain_inherits(source):
+    inherits, includes = scan_lines(source.splitlines())
+    return bool(inherits or includes)
+
+
+def hidden_in_sources(sources, docnames):
+    "Get the documents hidden by the document-level hides in the sources"
+    hidden = set()
+    for docname in docnames:
+        inherits, includes = scan_lines(sources[docname].splitlines())
+        for scanned in inherits:
+            hidden_docname = hidden_document(scanned)
+            if hidden_docname is not None:
+                logger.info("document '{}' is hidden by '{}'".format(
+                    hidden_docname, docname))
+                hidden.add(hidden_docname)
+    return hidden
+
+
+def read_document(source, docname, reader, engine, settings_overrides):
+    settings = dict(settings_overrides or {})
+    settings.update(inherit_engine=engine, inherit_docname=docname)
+    with docutils_namespace():
+        directives.register_directive('inherit', InheritDirective)
+        document = publish_doctree(
+            source, source_path=docname, reader=reader,
+            settings_overrides=settings)
+
+    # Make the doctree picklable so it can be returned by a worker process
+    document.reporter = None
+    document.transformer = None
+    document.settings.inherit_engine = None
+    document.settings.warning_stream = None
+    return document
+
+
+def extract_batch(batch, prune_hidden, settings_overrides):
+    "Extract the inherits from a batch of documents"
+    extracted = []
+    for docname, source in batch:
+        engine = InheritEngine(prune_hidden=prune_hidden)
+        read_document(
+            source, docname, ExtractReader(), engine, settings_overrides)
+        inherit_nodes = list(chain(*[
+            [n for d, n in parts]
+            for parts in engine.state.inherit_nodes.values()]))
+        problems = engine.state.inherit_problems.get(docname, [])
+        extracted.append((docname, inherit_nodes, problems))
+    return extracted
+
+
+def apply_batch(batch, prune_hidden, settings_overrides):
+    """
+    Read a batch of documents, applying the inherits that target them, sent
+    with the batch, and return the doctrees and which inherits were applied
+    """
+    jobs, keyed_parts = batch
+    engine = InheritEngine(
+        prune_hidden=prune_hidden, warn=lambda message, location: None)
+    parts_by_node = {}
+    for key, parts in keyed_parts:
+        for index, (source_docname, node) in enumerate(parts):
+            engine.store_node(key, index, source_docname, node)
+            parts_by_node[node] = (key, index)
+
+    published = []
+    for docname, source in jobs:
+        document = read_document(
+            source, docname, ApplyReader(), engine, settings_overrides)
+
+        applied = engine.state.inherit_applied.get(docname, set())
+        applied_parts = [parts_by_node[n] for n in applied]
+        labels = engine.state.inherit_document_labels.get(docname, set())
+        published.append((docname, document, applied_parts, labels))
+    return published
+
+
+def run_batches(function, batches, parallel, *args):
+    if parallel and len(batches) > 1:
+        try:
+            with ProcessPoolExecutor() as executor:
+                futures = [
+                    executor.submit(function, b, *args) for b in batches]
+                return list(chain(*[f.result() for f in futures]))
+        except (NotImplementedError, OSError):
+            # Processes are not available, so fall back to running in turn
+            pass
+    return list(chain(*[function(b, *args) for b in batches]))
+
+
+def in_batches(items, batch_size):
+    return [
+        items[i:i+batch_size] for i in range(0, len(items), batch_size)]
+
+
+def publish_doctrees(
+        sources, modules=(), modules_dir='', prune_hidden=False,
+        parallel=True, batch_size=100, settings_overrides=None):
+    """
+    Read the reStructuredText sources, a mapping of document names to their
+    text, without Sphinx, extracting their inherits and applying them in
+    module order, and return the resulting doctrees by document name
+    """
+    docnames = sort_by_module(list(sources), modules, Path(modules_dir), Path)
+    hidden = hidden_in_sources(sources, docnames)
+    docnames = [d for d in docnames if d not in hidden]
+    engine = InheritEngine(prune_hidden=prune_hidden)
+    state = engine.state
+
+    # Extract the inherits, in batches, from the documents that have any
+    batches = in_batches(
+        [(d, sources[d]) for d in docnames
+         if may_contain_inherits(sources[d])],
+        batch_size)
+    extracted = run_batches(
+        extract_batch, batches, parallel, prune_hidden, settings_overrides)
+    for docname, inherit_nodes, problems in extracted:
+        engine.store(docname, inherit_nodes)
+        if problems:
+            state.inherit_problems[docname] = problems
+
+    # Read all of the documents, in batches, applying the inherits. The labels
+    # of a document are not known until it is read, so every batch is sent
+    # the inherits that target labels.
+    labels = list(state.inherit_label_keys)
+    batches = []
+    for jobs in in_batches([(d, sources[d]) for d in docnames], batch_size):
+        keys = inherit_keys(
+            state, *[d for d, _ in jobs], None, labels=labels)
+        batches.append((jobs, [(k, state.inherit_nodes[k]) for k in keys]))
+    published = run_batches(
+        apply_batch, batches, parallel, prune_hidden, settings_overrides)
+
+    doctrees = {}
+    for docname, document, applied_parts, labels in published:
+        doctrees[docname] = document
+        for key, index in applied_parts:
+            source_docname, node = state.inherit_nodes[key][index]
+            engine.note_applied(docname, node)
+        for name in labels:
+            state.inherit_labels[name] = docname
+            state.inherit_document_labels[docname].add(name)
+
+    return PublishResult(
+        doctrees, dict(state.inherit_problems), list(engine.unapplied_nodes()))
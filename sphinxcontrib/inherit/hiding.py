@@ -0,0 +1,77 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import defaultdict
+from docutils.statemachine import StringList
+from sphinx.directives.other import TocTree
+from sphinx.util import docname_join
+from sphinx.util.nodes import explicit_title_re
+
+
+def hidden_docnames(env):
+    return getattr(env.project, 'inherit_hidden_docnames', set())
+
+
+def toctree_docname(env, entry):
+    "Get the name of the document a toctree entry refers to"
+    explicit = explicit_title_re.match(entry)
+    docname = explicit.group(2) if explicit else entry
+    for suffix in env.config.source_suffix:
+        if docname.endswith(suffix):
+            docname = docname[:-len(suffix)]
+            break
+    return docname_join(env.docname, docname)
+
+
+class InheritTocTree(TocTree):
+    "A toctree that leaves out the documents hidden by document-level hides"
+
+    def parse_content(self, toctree):
+        hidden = hidden_docnames(self.env)
+        if hidden:
+            kept_lines, kept_items = [], []
+            for line, item in zip(self.content, self.content.items):
+                docname = toctree_docname(self.env, line) if line else None
+                if docname in hidden:
+                    note_hidden_reference(self.env, docname)
+                    continue
+                kept_lines.append(line)
+                kept_items.append(item)
+            self.content = StringList(kept_lines, items=kept_items)
+
+        return super().parse_content(toctree)
+
+
+def note_hidden_reference(env, docname):
+    if not getattr(env, 'inherit_hidden_references', None):
+        env.inherit_hidden_references = defaultdict(set)
+    env.inherit_hidden_references[env.docname].add(docname)
+
+
+def reread_hidden_parents(app, env, added, changed, removed):
+    "Re-read the documents whose toctrees include documents hidden or shown"
+    hidden = set(hidden_docnames(env))
+    toggled = hidden ^ getattr(env, 'inherit_hidden_docnames', set())
+    env.inherit_hidden_docnames = hidden
+    if not toggled:
+        return []
+
+    parents = {
+        d for d, includes in env.toctree_includes.items()
+        if toggled.intersection(includes)}
+    parents |= {
+        d for d, references in getattr(
+            env, 'inherit_hidden_references', {}).items()
+        if toggled & references}
+    return sorted(parents & env.found_docs)
+
+
+def purge_hidden_references(app, env, docname):
+    if getattr(env, 'inherit_hidden_references', None):
+        env.inherit_hidden_references.pop(docname, None)
+
+
+def add_hiding(app):
+    app.add_directive('toctree', InheritTocTree, override=True)
+    app.connect('env-get-outdated', reread_hidden_parents)
+    app.connect('env-purge-doc', purge_hidden_references)
@@ -0,0 +1,78 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import argparse
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+
+def build(
+        srcdir, outdir, builders, confdir=None, doctreedir=None,
+        confoverrides=None, parallel=True):
+    """
+    Read the documents and apply their inherits once, then build each of the
+    builders from the same doctrees, each into its own output directory
+    """
+    confdir = confdir or srcdir
+    doctreedir = doctreedir or os.path.join(outdir, '.doctrees')
+    confoverrides = confoverrides or {}
+
+    statuscode = build_one(
+        'inherit-check', srcdir, confdir, outdir, doctreedir, confoverrides)
+    if statuscode:
+        return {'inherit-check': statuscode}
+
+    jobs = [
+        (b, srcdir, confdir, outdir, doctreedir, confoverrides)
+        for b in builders]
+    if parallel and len(jobs) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+                statuscodes = executor.map(build_one, *zip(*jobs))
+                return dict(zip(builders, statuscodes))
+        except (NotImplementedError, OSError):
+            # Processes are not available, so fall back to building in turn
+            pass
+
+    return {job[0]: build_one(*job) for job in jobs}
+
+
+def build_one(builder, srcdir, confdir, outdir, doctreedir, confoverrides):
+    "Build using the environment and doctrees that are in the doctree dir"
+    with patch_docutils(confdir), docutils_namespace():
+        app = Sphinx(
+            srcdir, confdir, os.path.join(outdir, builder), doctreedir,
+            builder, confoverrides)
+        app.build(False)
+    return app.statuscode
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Read the documentation once and then build it with each of the "
+            "builders, each in their own process."))
+    parser.add_argument('sourcedir')
+    parser.add_argument('outputdir')
+    parser.add_argument(
+        '-b', dest='builders', action='append', default=[], required=True)
+    parser.add_argument('-d', dest='doctreedir')
+    parser.add_argument('-c', dest='confdir')
+    parser.add_argument('--serial', dest='parallel', action='store_false')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    statuscodes = build(
+        args.sourcedir, args.outputdir, args.builders, confdir=args.confdir,
+        doctreedir=args.doctreedir, parallel=args.parallel)
+    return max(statuscodes.values())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
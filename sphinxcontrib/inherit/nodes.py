@@ -1,33 +1,58 @@
 # This file is part of the sphinxcontrib-inherit extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+import pickle
+
 from docpath import path as docpath
 from docutils import nodes
+from functools import lru_cache
+from os import path, unlink
 from sphinx import addnodes as sphinx_nodes
-from sphinx.util import logging
-
-logger = logging.getLogger(__name__)
+from sphinx.util.matching import Matcher
+from sphinx.util.osutil import ensuredir
 
 
 class inherit(nodes.Element, nodes.Structural):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._inherited_nodes = None
+        self._released_to = None
 
-    def check_number_of_children(self):
+    def has_required_number_of_children(self):
         if self.inherit_required_quantity == -1:
+            return True
+        return len(self.children) == self.inherit_required_quantity
+
+    def apply_filter(self):
+        "Keep only the outermost nodes that match the filter"
+        filter = self.get('filter', None)
+        if not filter:
             return
 
-        if len(self.children) != self.inherit_required_quantity:
-            logger.warning(
-                "inherit captured {} nodes instead of {}".format(
-                    len(self.children), self.inherit_required_quantity),
-                location=self.inherit_source)
+        matches = []
+        matched_nodes = set()
+        for node in docpath(filter).findall(self):
+            if node is self or has_ancestor_in(node, matched_nodes, self):
+                continue
+            matches.append(node)
+            matched_nodes.add(id(node))
+
+        self[:] = matches
+        del self['filter']
 
     def children_required_but_missing(self):
         return self.inherit_required_quantity and len(self.children) == 0
 
+    def in_scope(self, docname):
+        scope = self.get('scope', None)
+        if not scope:
+            return True
+        return docname_matcher(tuple(scope))(docname)
+
+    @property
+    def inherit_every(self):
+        return self.get('every', False)
+
     @property
     def inherit_index(self):
         return self['index']
@@ -46,30 +71,47 @@ class inherit(nodes.Element, nodes.Structural):
 
     @property
     def inherit_target(self):
-        file, *docpath = self['target'].split(',', 1)
-        if '[' in file or not docpath:
-            file = None
-            docpath = [self['target']]
-        return (file, docpath[0])
-
-    @property
-    def inherited_nodes(self):
-        if self._inherited_nodes is None:
-            filter = self.get('filter', None)
-            if filter:
-                self._inherited_nodes = []
-                for node in docpath(filter).findall(self):
-                    self._inherited_nodes.append(node.deepcopy())
-            else:
-                self._inherited_nodes = self.deepcopy().children
-
-            index = self.get('index', None)
-            if index is not None:
-                for node in self._inherited_nodes:
-                    if isinstance(node, sphinx_nodes.toctree):
-                        node['inherit_index'] = int(index)
-
-        return self._inherited_nodes
+        return split_target(self['target'])
+
+    def instantiate(self):
+        "Get a new instance of the nodes to be inherited"
+        if getattr(self, '_released_to', None):
+            with open(self._released_to, 'rb') as file:
+                return self._index_toctrees(pickle.load(file))
+        return self._index_toctrees(clone_nodes(self.children))
+
+    def release(self, filename):
+        """
+        Move the nodes to be inherited into the file, and return them so they
+        can be inherited without being copied
+        """
+        ensuredir(path.dirname(filename))
+        with open(filename, 'wb') as file:
+            pickle.dump(self.children, file, pickle.HIGHEST_PROTOCOL)
+
+        released = self.children
+        self.children = []
+        self._released_to = filename
+        for node in released:
+            node.parent = None
+        return self._index_toctrees(released)
+
+    def _index_toctrees(self, inherited_nodes):
+        index = self.get('index', None)
+        if index is not None:
+            for node in inherited_nodes:
+                if isinstance(node, sphinx_nodes.toctree):
+                    node['inherit_index'] = int(index)
+        return inherited_nodes
+
+    def discard(self):
+        "Remove the file any released nodes were moved to"
+        if getattr(self, '_released_to', None):
+            try:
+                unlink(self._released_to)
+            except OSError:
+                pass
+        self._released_to = None
 
 
 class inherit_hidden(nodes.Element, nodes.Structural):
@@ -92,6 +134,76 @@ def add_nodes(app):
         )
 
 
+def clone_nodes(fragment):
+    "Copy the nodes and their descendants without recursing"
+    clones = [node.copy() for node in fragment]
+    stack = list(zip(fragment, clones))
+    while stack:
+        node, clone = stack.pop()
+        for child in getattr(node, 'children', []):
+            # Link the clones directly, as appending looks up the document
+            # through every ancestor
+            child_clone = child.copy()
+            child_clone.parent = clone
+            clone.children.append(child_clone)
+            stack.append((child, child_clone))
+    return clones
+
+
+def detach_from_document(node):
+    for descendant in iter_tree(node):
+        descendant.document = None
+
+
+@lru_cache(maxsize=None)
+def docname_matcher(patterns):
+    return Matcher(list(patterns))
+
+
+def is_docname_pattern(docname):
+    "Check whether a target's document name is a pattern for many documents"
+    return docname is not None and any(c in docname for c in '*?')
+
+
+def matching_docnames(docname, docnames):
+    "Get the documents that a target's document name, or pattern, matches"
+    if is_docname_pattern(docname):
+        return set(filter(docname_matcher((docname,)), docnames))
+    return {docname} & set(docnames)
+
+
+def has_ancestor_in(node, ancestors, root):
+    parent = node.parent
+    while parent is not None and parent is not root:
+        if id(parent) in ancestors:
+            return True
+        parent = parent.parent
+    return False
+
+
+def has_inherit_ancestor(node):
+    parent = node.parent
+    while parent is not None:
+        if isinstance(parent, inherit):
+            return True
+        parent = parent.parent
+    return False
+
+
+def is_nested(node):
+    "Whether the node is inside other markup, rather than only in sections"
+    parent = node.parent
+    while isinstance(parent, nodes.section):
+        parent = parent.parent
+    return parent is not None and not isinstance(parent, nodes.document)
+
+
+def in_document(node, document):
+    while node.parent is not None:
+        node = node.parent
+    return node is document
+
+
 def insert_nodes(element, index, nodes):
     for node in reversed(nodes):
         element.insert(index, node)
@@ -101,6 +213,40 @@ def is_indirect_target(node):
     return isinstance(node, nodes.target) and node.get('refname', None)
 
 
+def is_internal_target(node):
+    return isinstance(node, nodes.target) and not (
+        node.get('refuri', None) or node.get('refid', None) or
+        node.get('refname', None))
+
+
+def iter_tree(node):
+    "Iterate over the node and its descendants in document order"
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def node_at(root, location):
+    "Get the node at the location, a list of child indexes, from the root"
+    node = root
+    for index in location:
+        node = node.children[index]
+    return node
+
+
+def node_location(node):
+    "Get the location of the node, as a list of child indexes, from its root"
+    location = []
+    while node.parent is not None:
+        siblings = node.parent.children
+        location.append(next(i for i, n in enumerate(siblings) if n is node))
+        node = node.parent
+    location.reverse()
+    return location
+
+
 def move_to_before(node, target):
     index = target.parent.index(target)
     remove_node(node)
@@ -123,6 +269,29 @@ def remove_node(node):
     node.parent = None
 
 
+def update_structure_hash(hash, fragment):
+    "Update the hash with the structure and content of the nodes"
+    for root in fragment:
+        for node in iter_tree(root):
+            if isinstance(node, nodes.Text):
+                description = '\0T{}'.format(node)
+            else:
+                description = '\0E{}\0{}\0{!r}'.format(
+                    node.tagname, len(node.children),
+                    [(k, node.attributes[k]) for k in sorted(node.attributes)])
+            hash.update(description.encode('utf-8', 'surrogateescape'))
+    return hash
+
+
+def split_target(target):
+    "Split a target into its document name, if it has one, and its path"
+    file, *docpath = target.split(',', 1)
+    if '[' in file or not docpath:
+        file = None
+        docpath = [target]
+    return (file, docpath[0])
+
+
 def _get_node_types():
     node_types = {}
 
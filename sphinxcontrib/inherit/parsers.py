@@ -0,0 +1,198 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import docutils
+import os
+import pickle
+import sphinx
+import time
+
+from docutils import nodes
+from hashlib import sha1
+from sphinx.environment import CONFIG_OK
+from sphinx.parsers import RSTParser
+from sphinx.util.osutil import ensuredir
+
+from .nodes import iter_tree
+
+# The document attributes that belong to the document being read
+_document_state = (
+    'children', 'document', 'reporter', 'settings', 'transformer')
+
+
+class InheritRSTParser(RSTParser):
+    """
+    A parser that replays the unchanged documents parsed in earlier builds,
+    or in the builds that wrote the shards
+    """
+
+    def parse(self, inputstring, document):
+        env = document.settings.env
+        docname = env.docname
+        key = cache_key(inputstring)
+
+        cached = load_shard_doctree(env, docname, key)
+        if cached is None and env.config.inherit_cache_parsed_doctrees:
+            cached = load_pristine_doctree(env, docname, key)
+        if cached is not None:
+            replay_doctree(env, docname, document, cached)
+            return
+
+        super().parse(inputstring, document)
+
+        if not (env.config.inherit_cache_parsed_doctrees or
+                getattr(env.project, 'inherit_modules_only', False)):
+            # Only the shard builds save the doctrees without the cache
+            return
+        if in_domain_data(env, docname) or docname in env.reread_always:
+            # Directives that update the environment must be run again
+            remove_pristine_doctree(env, docname)
+        else:
+            save_pristine_doctree(env, docname, document, key)
+
+
+def cache_key(inputstring):
+    if not isinstance(inputstring, str):
+        inputstring = '\n'.join(inputstring)
+    return (
+        sha1(inputstring.encode('utf-8')).hexdigest(),
+        sphinx.__version__, docutils.__version__)
+
+
+def in_domain_data(env, docname):
+    """
+    Whether any of the domains' entries are for the document, which has been
+    cleared from them before it was read, so parsing it must have added them
+    """
+    values = list(env.domaindata.values())
+    while values:
+        value = values.pop()
+        if isinstance(value, str):
+            if value == docname:
+                return True
+        elif isinstance(value, dict):
+            values += value.keys()
+            values += value.values()
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            values += value
+        elif getattr(value, 'docname', None) == docname:
+            return True
+    return False
+
+
+def pristine_doctree_filename(env, docname):
+    return os.path.join(env.doctreedir, 'inherit', docname + '.pickle')
+
+
+def load_pristine_doctree(env, docname, key):
+    "Get the doctree as it was parsed, if neither it nor its includes changed"
+    if env.config_status != CONFIG_OK:
+        return None
+
+    filename = pristine_doctree_filename(env, docname)
+    try:
+        with open(filename, 'rb') as file:
+            cached = pickle.load(file)
+    except Exception:
+        return None
+
+    if cached['key'] != key:
+        return None
+
+    for dependency in cached['dependencies'] | cached['record_dependencies']:
+        try:
+            mtime = os.path.getmtime(os.path.join(env.srcdir, dependency))
+        except OSError:
+            return None
+        if mtime > cached['time']:
+            return None
+
+    return cached
+
+
+def load_shard_doctree(env, docname, key):
+    "Get the doctree parsed by a shard build, if it and its includes match"
+    cached = getattr(env.project, 'inherit_shard_doctrees', {}).get(docname)
+    if cached is None or cached['key'] != key:
+        return None
+
+    # The shard may have been built on another machine, so the contents of
+    # the dependencies are compared rather than their times
+    for dependency, digest in cached['digests'].items():
+        if file_digest(os.path.join(env.srcdir, dependency)) != digest:
+            return None
+
+    return cached
+
+
+def file_digest(filename):
+    try:
+        with open(filename, 'rb') as file:
+            return sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def save_pristine_doctree(env, docname, document, key):
+    settings = document.settings
+    reporter, transformer = document.reporter, document.transformer
+    document.settings = document.reporter = document.transformer = None
+    try:
+        doctree = pickle.dumps(document, pickle.HIGHEST_PROTOCOL)
+    finally:
+        document.settings = settings
+        document.reporter, document.transformer = reporter, transformer
+
+    record_dependencies = getattr(settings, 'record_dependencies', None)
+    cached = {
+        'key': key,
+        'time': time.time(),
+        'doctree': doctree,
+        'dependencies': set(env.dependencies.get(docname, set())),
+        'record_dependencies': set(getattr(record_dependencies, 'list', [])),
+        'included': set(env.included.get(docname, set())),
+        }
+
+    filename = pristine_doctree_filename(env, docname)
+    ensuredir(os.path.dirname(filename))
+    with open(filename, 'wb') as file:
+        pickle.dump(cached, file, pickle.HIGHEST_PROTOCOL)
+
+
+def remove_pristine_doctree(env, docname):
+    try:
+        os.unlink(pristine_doctree_filename(env, docname))
+    except OSError:
+        pass
+
+
+def replay_doctree(env, docname, document, cached):
+    "Make the document the same as the cached doctree was after parsing"
+    doctree = pickle.loads(cached['doctree'])
+    for name, value in vars(doctree).items():
+        if name not in _document_state:
+            setattr(document, name, value)
+
+    document.children = doctree.children
+    for child in document.children:
+        child.parent = document
+    for node in iter_tree(document):
+        node.document = document
+        if isinstance(node, nodes.pending):
+            document.note_pending(node)
+
+    env.dependencies[docname] |= cached['dependencies']
+    env.included[docname] |= cached['included']
+    for dependency in cached['record_dependencies']:
+        document.settings.record_dependencies.add(dependency)
+
+
+def add_parsers(app):
+    app.connect('builder-inited', inherit_parsers)
+
+
+def inherit_parsers(app):
+    if (app.config.inherit_cache_parsed_doctrees or
+            app.config.inherit_shards or
+            getattr(app.builder, 'inherit_modules_only', False)):
+        app.add_source_parser(InheritRSTParser, override=True)
@@ -1,6 +1,8 @@
 # This file is part of the sphinxcontrib-inherit extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+import os
+
 from pathlib import Path
 
 
@@ -17,3 +19,37 @@ def path_subdir_contains(path, other_path):
     return (
         path_contains(path, other_path) and
         (len(Path(other_path).parts) - len(path.parts)) > 1)
+
+
+def path_module(modules_dir, modules, other_path):
+    "Get the module whose directory contains the path, if there is one"
+    for module in modules:
+        if path_contains(modules_dir / module, other_path):
+            return module
+    return None
+
+
+def walk_source_files(srcdir, modules_dir, modules, excluded):
+    "Walk the source files, never entering disabled or excluded directories"
+    srcdir = Path(srcdir)
+    modules_root = srcdir / modules_dir
+    enabled_roots = frozenset(str(modules_root / m) for m in modules)
+
+    for root, dirs, files in os.walk(str(srcdir), followlinks=True):
+        relative_root = Path(root).relative_to(srcdir)
+        in_modules_dir = Path(root) == modules_root
+
+        kept_dirs = []
+        for name in sorted(dirs):
+            if (in_modules_dir and
+                    os.path.join(root, name) not in enabled_roots):
+                continue
+            if excluded((relative_root / name).as_posix()):
+                continue
+            kept_dirs.append(name)
+        dirs[:] = kept_dirs
+
+        for name in sorted(files):
+            filename = (relative_root / name).as_posix()
+            if not excluded(filename):
+                yield filename
@@ -0,0 +1,120 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+
+from glob import glob
+from sphinx.locale import __
+from sphinx.project import EXCLUDE_PATHS, Project
+from sphinx.util import logging
+from sphinx.util.matching import compile_matchers
+
+from .path import Path, path_module, walk_source_files
+from .scanner import hidden_documents
+
+logger = logging.getLogger(__name__)
+
+
+class InheritProject(Project):
+    "A project that never looks for documents in disabled module directories"
+
+    def __init__(
+            self, srcdir, source_suffix, modules_dir='', modules=(), env=None,
+            modules_only=False, root_doc='index'):
+        super().__init__(srcdir, source_suffix)
+        self.inherit_modules_dir = modules_dir
+        self.inherit_modules = frozenset(modules)
+        self.inherit_env = env
+        self.inherit_hidden_docnames = set()
+        # Only the root document is found outside the modules, when only
+        # the modules' documents are read
+        self.inherit_modules_only = modules_only
+        self.inherit_root_doc = root_doc
+        # The doctrees parsed by shard builds, replayed instead of parsing
+        self.inherit_shard_doctrees = {}
+
+    def __getstate__(self):
+        # The environment is pickled on its own, and the shards are loaded
+        # by each build
+        state = self.__dict__.copy()
+        state['inherit_env'] = None
+        state['inherit_shard_doctrees'] = {}
+        return state
+
+    def discover(self, exclude_paths=(), include_paths=('**',)):
+        self.docnames = set()
+        # Newer versions of Sphinx map between documents and their files
+        path_to_docname = getattr(self, '_path_to_docname', {})
+        docname_to_path = getattr(self, '_docname_to_path', {})
+        path_to_docname.clear()
+        docname_to_path.clear()
+
+        excludes = compile_matchers(list(exclude_paths) + EXCLUDE_PATHS)
+        includes = compile_matchers(list(include_paths))
+
+        def excluded(filename):
+            return any(m(filename) for m in excludes)
+
+        # The disabled modules' directories are pruned with a set lookup
+        source_files = walk_source_files(
+            self.srcdir, self.inherit_modules_dir, self.inherit_modules,
+            excluded)
+        modules_dir = Path(self.inherit_modules_dir)
+        for filename in source_files:
+            if not any(m(filename) for m in includes):
+                continue
+
+            docname = self.path2doc(filename)
+            if not docname:
+                continue
+            if (self.inherit_modules_only and
+                    docname != self.inherit_root_doc and
+                    not path_module(
+                        modules_dir, self.inherit_modules, filename)):
+                continue
+
+            if docname in self.docnames:
+                pattern = os.path.join(self.srcdir, docname) + '.*'
+                files = [
+                    os.path.relpath(f, self.srcdir)
+                    for f in sorted(glob(pattern))]
+                logger.warning(
+                    __('multiple files found for the document "%s": %r\n'
+                       'Use %r for the build.'),
+                    docname, files, str(self.doc2path(docname, True)),
+                    once=True)
+            elif os.access(os.path.join(self.srcdir, filename), os.R_OK):
+                self.docnames.add(docname)
+                path_to_docname[Path(filename)] = docname
+                docname_to_path[docname] = Path(filename)
+            else:
+                logger.warning(
+                    __("document not readable. Ignored."), location=docname)
+
+        self._remove_hidden_documents(path_to_docname, docname_to_path)
+        return self.docnames
+
+    def _remove_hidden_documents(self, path_to_docname, docname_to_path):
+        "Remove the documents that are hidden by document-level hides"
+        if self.inherit_env is None:
+            return
+
+        hidden = hidden_documents(
+            self.inherit_env, sorted(self.docnames),
+            lambda d: str(self.doc2path(d, True)))
+        self.inherit_hidden_docnames = hidden
+
+        for docname in hidden & self.docnames:
+            self.docnames.discard(docname)
+            path_to_docname.pop(docname_to_path.pop(docname, None), None)
+
+
+def inherit_project(app):
+    "Replace the project with one that only finds enabled modules' documents"
+    project = InheritProject(
+        app.srcdir, app.config.source_suffix,
+        app.config.inherit_modules_dir, app.config.inherit_modules, app.env,
+        getattr(app.builder, 'inherit_modules_only', False),
+        app.config.master_doc)
+    project.restore(app.project)
+    app.project = app.env.project = project
@@ -0,0 +1,315 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import Counter, defaultdict
+from docpath import path as docpath
+from docutils import nodes
+from functools import lru_cache
+from re import compile
+
+from .nodes import is_internal_target, iter_tree
+
+_name = r'[a-zA-Z_][a-zA-Z0-9_.-]*'
+_literal = r'(?P<quote>[\'"])(?P<value>[^\'"]*)(?P=quote)'
+
+_node_type = r'^//(?P<node_type>{}|\*)'.format(_name)
+
+_indexed_paths = [
+    compile(_node_type + r'$'),
+    compile(
+        _node_type + r'\[\s*@(?P<attribute>names|ids)\s*==\s*{}\s*\]$'
+        .format(_literal)),
+    compile(
+        _node_type + r'\[\s*\./(?P<child_type>{})\s*\]$'.format(_name)),
+    ]
+
+
+def attribute_text(value):
+    if isinstance(value, (list, tuple)):
+        return ' '.join(value)
+    return str(value)
+
+
+def node_name(node):
+    return node.__class__.__name__
+
+
+def is_element(node):
+    "Whether the node is matched by the '*' node test"
+    return node_name(node) not in ('Text', 'comment')
+
+
+class DocumentIndex:
+    """
+    The nodes in a document that each of the document's index queries
+    matches, all found with a single walk of the document
+    """
+
+    def __init__(self, document, queries=()):
+        self.document = document
+        self.pending = Counter(q for q in queries if isinstance(q, IndexQuery))
+        self.matcher = QueryMatcher(self.pending)
+        self.invalidate()
+
+    def invalidate(self):
+        self._matches = None
+
+    def first_match(self, query):
+        return next(iter(self.matches(query)), None)
+
+    def matches(self, query):
+        "Get all of the nodes that the query matches, in document order"
+        if query not in self.pending:
+            self.pending[query] += 1
+            self.matcher.add(query)
+            self.invalidate()
+
+        if self._matches is None:
+            self._matches = self.matcher.all_matches(self.document)
+        return self._matches.get(query, [])
+
+    def done(self, query):
+        "Note one of the uses of the query has been answered"
+        if self.pending.get(query, 0) > 0:
+            self.pending[query] -= 1
+            if self.pending[query] == 0:
+                del self.pending[query]
+                self.matcher.discard(query)
+
+    def note_changed(self, changed_nodes):
+        "Invalidate the index if the nodes added or removed match a query"
+        if self._matches is not None and self.matcher.any_match(changed_nodes):
+            self.invalidate()
+
+
+class QueryMatcher:
+    "Match nodes against a set of index queries at once"
+
+    def __init__(self, queries=()):
+        self._types = defaultdict(list)
+        self._attributes = defaultdict(list)
+        self._any = []
+        for query in queries:
+            self.add(query)
+
+    def _queries_for(self, query):
+        if query.attribute is not None:
+            return self._attributes[(query.attribute, query.value)]
+        if query.node_type == '*':
+            return self._any
+        return self._types[query.node_type]
+
+    def add(self, query):
+        self._queries_for(query).append(query)
+
+    def discard(self, query):
+        queries = self._queries_for(query)
+        if query in queries:
+            queries.remove(query)
+
+    def candidates(self, node):
+        "Get the queries the node could match"
+        candidates = self._types.get(node_name(node), []) + self._any
+        attributes = getattr(node, 'attributes', {})
+        for attribute in ('names', 'ids'):
+            value = attributes.get(attribute, None)
+            if value is not None:
+                key = (attribute, attribute_text(value))
+                candidates += self._attributes.get(key, [])
+        return candidates
+
+    def all_matches(self, document):
+        "Find the nodes in the document that each query matches"
+        matches = defaultdict(list)
+        for node in iter_tree(document):
+            # Paths starting with '//' never match the document itself
+            if node is document:
+                continue
+            for query in self.candidates(node):
+                if query.matches(node):
+                    matches[query].append(node)
+        return matches
+
+    def any_match(self, roots):
+        """
+        Whether any of the nodes, or their descendants, match a query, or
+        adding or removing the nodes can change whether their parent does
+        """
+        for root in roots:
+            if root.parent is not None and any(
+                    query.child_type == node_name(root)
+                    for query in self.candidates(root.parent)):
+                return True
+        return any(
+            query.matches(node)
+            for root in roots for node in iter_tree(root)
+            for query in self.candidates(node))
+
+
+class IndexQuery:
+    "A query for a target that can be answered using a document index"
+
+    def __init__(
+            self, node_type, attribute=None, value=None, child_type=None):
+        self.node_type = node_type
+        self.attribute = attribute
+        self.value = value
+        self.child_type = child_type
+
+    def find(self, index):
+        return index.first_match(self)
+
+    def find_all(self, index):
+        return index.matches(self)
+
+    @property
+    def feature(self):
+        return (self.node_type, self.attribute, self.value, self.child_type)
+
+    def matches(self, node):
+        if self.node_type == '*':
+            if not is_element(node):
+                return False
+        elif node_name(node) != self.node_type:
+            return False
+
+        if self.attribute is not None:
+            value = node.attributes.get(self.attribute, None)
+            if value is None or attribute_text(value) != self.value:
+                return False
+
+        if self.child_type is not None:
+            if not any(node_name(c) == self.child_type for c in node.children):
+                return False
+
+        return True
+
+
+class DocpathQuery:
+    "A query for a target that is answered by evaluating the docpath"
+
+    def __init__(self, path):
+        self.path = docpath(path)
+        self.relative_path = None
+        if path.startswith('//'):
+            self.relative_path = docpath('.' + path)
+
+    def find(self, index):
+        return self.path.find(index.document)
+
+    def find_all(self, index):
+        return list(self.path.findall(index.document))
+
+    feature = None
+
+    def matches_in(self, root):
+        "Whether the path matches one of the descendants of a detached node"
+        if self.relative_path is None:
+            return False
+        return self.relative_path.find(root) is not None
+
+
+class LabelQuery:
+    "A query for a target that is labelled with an explicit target"
+
+    def __init__(self, label):
+        self.label = nodes.fully_normalize_name(label)
+
+    def find(self, index):
+        document = index.document
+        if not document.nametypes.get(self.label, False):
+            return None
+
+        node = document.ids.get(document.nameids.get(self.label, None), None)
+        if node is not None and is_internal_target(node):
+            node = next_labelled_node(node)
+        return node
+
+    def find_all(self, index):
+        node = self.find(index)
+        return [] if node is None else [node]
+
+    @property
+    def feature(self):
+        return ('label', self.label)
+
+
+def provided_features(root):
+    """
+    Get the features of the descendants of a node that index and label queries
+    look for, so the queries that match a node can be found without a walk
+    """
+    features = set()
+    for node in iter_tree(root):
+        if node is root or not is_element(node):
+            continue
+        node_type = node_name(node)
+        for query_type in (node_type, '*'):
+            features.add((query_type, None, None, None))
+            for attribute in ('names', 'ids'):
+                value = node.attributes.get(attribute, None)
+                if value is not None:
+                    features.add(
+                        (query_type, attribute, attribute_text(value), None))
+            for child in node.children:
+                features.add((query_type, None, None, node_name(child)))
+        for name in node.get('names', []):
+            features.add(('label', name))
+    return features
+
+
+@lru_cache(maxsize=None)
+def compile_query(path):
+    "Get the query that finds the target node for the path"
+    if path.startswith('label:'):
+        return LabelQuery(path[len('label:'):])
+
+    for indexed_path in _indexed_paths:
+        match = indexed_path.match(path.strip())
+        if match:
+            parts = match.groupdict()
+            parts.pop('quote', None)
+            return IndexQuery(**parts)
+    return DocpathQuery(path)
+
+
+def iter_following(node):
+    "Iterate over the node, its descendants and the nodes that follow it"
+    yield from iter_tree(node)
+    yield from following_nodes(node)
+
+
+def following_nodes(node):
+    "Iterate over the nodes that follow the node, but not its descendants"
+    while node.parent is not None:
+        siblings = node.parent.children
+        index = next(i for i, n in enumerate(siblings) if n is node)
+        for sibling in siblings[index+1:]:
+            yield from iter_tree(sibling)
+        node = node.parent
+
+
+def following_element(node):
+    "Evaluate 'following::*'"
+    return next(filter(is_element, following_nodes(node)), None)
+
+
+def next_sibling_element(siblings, index):
+    "Evaluate 'following_sibling::*' for the sibling at the index"
+    return next(filter(is_element, siblings[index+1:]), None)
+
+
+def next_node_after_any_target_nodes(from_node):
+    "Evaluate '(descendant_or_self::node|following::node)[name() != target]'"
+    for node in iter_following(from_node):
+        target_names = set(
+            c.astext() for c in node.children if node_name(c) == 'target')
+        if node_name(node) not in target_names:
+            return node
+
+
+def next_labelled_node(target):
+    "Get the node that an internal target labels"
+    for node in iter_following(target):
+        if not isinstance(node, nodes.Invisible):
+            return node
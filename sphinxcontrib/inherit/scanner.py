@@ -0,0 +1,179 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+
+from collections import namedtuple
+from docutils.nodes import fully_normalize_name
+from re import compile
+from sphinx.util import logging
+
+from .nodes import matching_docnames, split_target
+
+logger = logging.getLogger(__name__)
+
+positions = ('after', 'before', 'hide', 'inside')
+
+_inherit_directive = compile(
+    r'^\s*\.\.\s+inherit::\s+(?P<position>\S+)\s+(?P<target>\S.*?)\s*$')
+_directive = compile(r'^\s*\.\.\s+(?P<name>[\w.+-]+(:[\w.+-]+)*)::')
+_comment = compile(r'^\s*\.\.(\s+[^\s_|\[]|\s*$)')
+
+# The directives whose content is literal text rather than reStructuredText
+_literal_directives = frozenset([
+    'code', 'code-block', 'parsed-literal', 'raw', 'sourcecode'])
+
+ScannedInherit = namedtuple('ScannedInherit', 'line position target indent')
+SourceScan = namedtuple('SourceScan', 'mtime inherits includes')
+
+
+def scan_source(filename):
+    "Find the inherit directives in a source file without parsing it"
+    with open(filename, 'r', encoding='utf-8', errors='replace') as file:
+        return scan_lines(file)
+
+
+def scan_lines(lines):
+    """
+    Find the inherit directives in the lines of a source, skipping literal
+    blocks and comments
+    """
+    inherits = []
+    includes = False
+    # The indentation of the line whose indented block is being skipped
+    skipped_indent = None
+    for line_number, line in enumerate(lines, 1):
+        if skipped_indent is not None:
+            if not line.strip():
+                continue
+            if len(line) - len(line.lstrip()) > skipped_indent:
+                continue
+            skipped_indent = None
+        if '::' not in line and '..' not in line:
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        directive = _directive.match(line)
+        if directive is None:
+            if _comment.match(line) or line.rstrip().endswith('::'):
+                skipped_indent = indent
+            continue
+
+        name = directive.group('name')
+        if name in _literal_directives:
+            skipped_indent = indent
+        elif name == 'include':
+            includes = True
+        elif name == 'inherit':
+            match = _inherit_directive.match(line)
+            if match:
+                inherits.append(ScannedInherit(
+                    line_number, match.group('position'),
+                    match.group('target'), indent))
+    return inherits, includes
+
+
+def scan_document(env, docname, filename=None):
+    "Get the scan of the document, scanning it again only if it has changed"
+    if not getattr(env, 'inherit_scans', None):
+        env.inherit_scans = {}
+
+    if filename is None:
+        filename = env.doc2path(docname)
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:
+        return SourceScan(None, [], False)
+
+    scan = env.inherit_scans.get(docname, None)
+    if scan is None or scan.mtime != mtime:
+        scan = SourceScan(mtime, *scan_source(filename))
+        env.inherit_scans[docname] = scan
+    return scan
+
+
+def may_contain_inherits(env, docname):
+    scan = scan_document(env, docname)
+    return bool(scan.inherits or scan.includes)
+
+
+def hidden_document(scanned):
+    """
+    Get the document that a document-level hide hides, if it is one, only
+    honouring hides that are not indented inside other markup
+    """
+    if (scanned.position == 'hide' and not scanned.indent and
+            scanned.target.startswith('document:')):
+        return scanned.target[len('document:'):].strip()
+    return None
+
+
+def hidden_documents(env, docnames, doc_path):
+    "Get the documents hidden by the document-level hides in the documents"
+    hidden = set()
+    for docname in docnames:
+        scan = scan_document(env, docname, doc_path(docname))
+        for scanned in scan.inherits:
+            hidden_docname = hidden_document(scanned)
+            if hidden_docname is not None:
+                logger.info("document '{}' is hidden by '{}'".format(
+                    hidden_docname, docname))
+                hidden.add(hidden_docname)
+    return hidden
+
+
+def target_docname(env, target):
+    "Get the name of the document a target must be in, if it is known"
+    docname, path = split_target(target)
+    if docname is None and path.startswith('label:'):
+        label = fully_normalize_name(path[len('label:'):])
+        docname = getattr(env, 'inherit_labels', {}).get(label, None)
+    return docname
+
+
+def validate_inherit(env, docname, scanned):
+    location = (docname, scanned.line)
+    if scanned.position not in positions:
+        logger.warning(
+            "unknown inherit position '{}'".format(scanned.position),
+            location=location)
+
+    docname, path = split_target(scanned.target)
+    if scanned.target.startswith('document:'):
+        docname = scanned.target[len('document:'):].strip()
+    hidden = getattr(env.project, 'inherit_hidden_docnames', set())
+    if docname is not None and not matching_docnames(
+            docname, env.found_docs | hidden):
+        logger.warning(
+            "inherit target document '{}' not found".format(docname),
+            location=location)
+
+
+def inherit_get_outdated(app, env, added, changed, removed):
+    "Validate the changed inherits, and re-read the documents they target"
+    for docname in removed:
+        getattr(env, 'inherit_scans', {}).pop(docname, None)
+
+    docnames = set(added) | set(changed)
+    targets = set()
+    for docname in sorted(docnames):
+        for scanned in scan_document(env, docname).inherits:
+            validate_inherit(env, docname, scanned)
+            targets.add(target_docname(env, scanned.target))
+
+    found_docs = set()
+    for target in targets:
+        found_docs |= matching_docnames(target, env.found_docs)
+    return sorted(found_docs - docnames)
+
+
+def schedule_docnames(env, docnames):
+    "Move the documents that may contain inherits to the start of docnames"
+    contain_inherits = {d for d in docnames if may_contain_inherits(env, d)}
+    docnames[:] = (
+        [d for d in docnames if d in contain_inherits] +
+        [d for d in docnames if d not in contain_inherits])
+
+
+def add_scanner(app):
+    app.connect('env-get-outdated', inherit_get_outdated)
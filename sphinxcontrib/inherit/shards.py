@@ -0,0 +1,95 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import pickle
+
+from os import path
+from sphinx.builders import Builder
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+
+from .parsers import file_digest, pristine_doctree_filename
+
+logger = logging.getLogger(__name__)
+
+
+class InheritShardBuilder(Builder):
+    """
+    Read only the documents of the enabled modules, and write the doctrees
+    parsed from them to a shard that another build can replay
+    """
+    name = 'inherit-shard'
+    epilog = "The inherit shard is in %(outdir)s/inherit-shard.pickle."
+    inherit_modules_only = True
+
+    def get_outdated_docs(self):
+        return self.env.found_docs
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write(self, *ignored):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def finish(self):
+        ensuredir(self.outdir)
+        write_shard(self.env, path.join(self.outdir, 'inherit-shard.pickle'))
+
+
+def write_shard(env, filename):
+    """
+    Write the doctree parsed from each document, with the digests of the
+    files it was parsed from
+    """
+    documents = {}
+    for docname in sorted(env.found_docs):
+        try:
+            with open(pristine_doctree_filename(env, docname), 'rb') as file:
+                cached = pickle.load(file)
+        except OSError:
+            # The directives of the document must be run again
+            continue
+
+        dependencies = cached['dependencies'] | cached['record_dependencies']
+        cached['digests'] = {
+            d: file_digest(path.join(env.srcdir, d)) for d in dependencies}
+        documents[docname] = cached
+
+    with open(filename, 'wb') as file:
+        pickle.dump({
+            'modules': list(env.config.inherit_modules),
+            'documents': documents,
+            }, file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_shards(filenames):
+    "Read the doctrees of the shards' documents"
+    documents = {}
+    for filename in filenames:
+        with open(filename, 'rb') as file:
+            documents.update(pickle.load(file)['documents'])
+    return documents
+
+
+def load_shards(app):
+    "Let the project replay the doctrees from the shards instead of parsing"
+    filenames = [path.join(app.confdir, f) for f in app.config.inherit_shards]
+    if not filenames:
+        return
+
+    documents = read_shards(filenames)
+    app.project.inherit_shard_doctrees = documents
+    logger.info("loaded the doctrees of {} documents from {} shards".format(
+        len(documents), len(filenames)))
+
+
+def add_shards(app):
+    app.add_builder(InheritShardBuilder)
+
+    app.connect('builder-inited', load_shards)
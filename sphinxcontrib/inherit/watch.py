@@ -0,0 +1,144 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import argparse
+import os
+import sys
+import time
+
+from sphinx.application import Sphinx
+from sphinx.util import logging
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+from sphinx.util.matching import compile_matchers
+
+from .path import walk_source_files
+from .engine import unapplied_inherit_nodes
+from .query import compile_query, provided_features
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher:
+    "Rebuild the documentation in memory whenever a source file changes"
+
+    def __init__(self, app, interval=0.5):
+        self.app = app
+        self.interval = interval
+        self.mtimes = self.get_mtimes()
+        # The features of each document that index and label queries look
+        # for, noted as documents are read, or taken from their doctrees
+        self.features = {}
+        app.connect('doctree-read', self.note_features)
+
+    def note_features(self, app, doctree):
+        self.features[app.env.docname] = provided_features(doctree)
+
+    def document_features(self, docname):
+        if docname not in self.features:
+            self.features[docname] = provided_features(
+                self.app.env.get_doctree(docname))
+        return self.features[docname]
+
+    def get_mtimes(self):
+        app = self.app
+        excludes = compile_matchers(app.config.exclude_patterns)
+        source_files = walk_source_files(
+            app.srcdir, app.config.inherit_modules_dir,
+            app.config.inherit_modules,
+            lambda f: any(m(f) for m in excludes))
+
+        mtimes = {}
+        for filename in source_files:
+            try:
+                mtimes[filename] = os.stat(
+                    os.path.join(app.srcdir, filename)).st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def poll(self):
+        "Get the source files that have changed since the last poll"
+        mtimes = self.get_mtimes()
+        changed = {
+            f for f in set(mtimes) | set(self.mtimes)
+            if mtimes.get(f, None) != self.mtimes.get(f, None)}
+        self.mtimes = mtimes
+        return changed
+
+    def rebuild(self, changed):
+        "Rebuild the documents affected by the changed source files"
+        env = self.app.env
+        changed_docnames = set(filter(None, map(env.path2doc, changed)))
+        if not changed_docnames:
+            return
+
+        # Documents with existing inherits from the changed documents
+        # depend on them, and the documents the changed inherits name are
+        # found by the scanner, so both are re-read by the normal build
+        self.app.build(False)
+
+        # Newly added inherits without a target document may target any
+        # document that was not re-read
+        target_docnames = set()
+        for node in unapplied_inherit_nodes(env):
+            if (node.inherit_source[0] in changed_docnames and
+                    node.inherit_target[0] is None):
+                target_docnames |= self.target_docnames(node)
+        target_docnames -= changed_docnames
+        if target_docnames:
+            env.reread_always |= target_docnames
+            try:
+                self.app.build(False)
+            finally:
+                env.reread_always -= target_docnames
+
+    def target_docnames(self, node):
+        "Get the documents that may contain the target of an inherit"
+        env = self.app.env
+        feature = compile_query(node.inherit_target[1]).feature
+        return {
+            d for d in env.found_docs
+            if node.in_scope(d) and (
+                feature is None or feature in self.document_features(d))}
+
+    def watch(self):
+        "Keep rebuilding the documentation until interrupted"
+        logger.info("watching for changes in {}".format(self.app.srcdir))
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.poll()
+                if changed:
+                    self.rebuild(changed)
+        except KeyboardInterrupt:
+            pass
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build the documentation, then rebuild it whenever a source file "
+            "changes while keeping the inherits in memory."))
+    parser.add_argument('sourcedir')
+    parser.add_argument('outputdir')
+    parser.add_argument('-b', dest='builder', default='html')
+    parser.add_argument('-d', dest='doctreedir')
+    parser.add_argument('-c', dest='confdir')
+    parser.add_argument('--interval', type=float, default=0.5)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    confdir = args.confdir or args.sourcedir
+    doctreedir = args.doctreedir or os.path.join(args.outputdir, '.doctrees')
+    with patch_docutils(confdir), docutils_namespace():
+        app = Sphinx(
+            args.sourcedir, confdir, args.outputdir, doctreedir, args.builder)
+        app.build(False)
+        Watcher(app, args.interval).watch()
+    return app.statuscode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
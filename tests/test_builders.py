@@ -1,8 +1,15 @@
 # This file is part of the sphinxcontrib-inherit extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+import json
+
 from sphinx_testing import with_app
+from sphinxcontrib.inherit.builders import (
+    InheritCheckError, skip_written_documents)
 from unittest import TestCase
+from unittest.mock import patch
+
+from .utils import change_document
 
 
 def with_builder_app(buildername):
@@ -12,6 +19,19 @@ def with_builder_app(buildername):
         warningiserror=True)
 
 
+def with_check_app(**confoverrides):
+    return with_app(
+        buildername='inherit-check',
+        confoverrides=confoverrides,
+        srcdir='tests/doc/basic/',
+        write_docstring='module/index.rst')
+
+
+def read_check_result(app):
+    filename = app.outdir / 'inherit-check.json'
+    return json.loads(filename.read_text(encoding='utf-8'))
+
+
 class TestInheritBuilders(TestCase):
 
     @with_builder_app('epub')
@@ -24,6 +44,11 @@ class TestInheritBuilders(TestCase):
         "Test building html documentation."
         app.builder.build_all()
 
+    @with_builder_app('inherit-check')
+    def test_builder_inherit_check(self, app, status, warning):
+        "Test checking the inherits without building any documentation."
+        app.builder.build_all()
+
     @with_builder_app('latex')
     def test_builder_latex(self, app, status, warning):
         "Test building latex documentation."
@@ -48,3 +73,125 @@ class TestInheritBuilders(TestCase):
     def test_builder_text(self, app, status, warning):
         "Test building text documentation."
         app.builder.build_all()
+
+
+class TestInheritCheckBuilder(TestCase):
+
+    @with_check_app()
+    def test_check_no_problems(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='tests']
+
+        A paragraph that is inherited.
+        """
+        app.builder.build_all()
+        self.assertEqual(read_check_result(app), {'problems': []})
+        self.assertFalse((app.outdir / 'index.html').exists())
+
+    @with_check_app()
+    def test_check_problems(self, app, status, warning):
+        """
+        .. inherit:: inside //non_existent_target
+
+        A paragraph that has no target.
+
+        .. inherit:: inside //section[@names=='tests']
+            :quantity: 2
+
+        A paragraph that is on its own.
+        """
+        app.builder.build_all()
+        problems = read_check_result(app)['problems']
+        self.assertEqual(
+            sorted((p['type'], p['target']) for p in problems), [
+                ('quantity', "//section[@names=='tests']"),
+                ('unresolved', '//non_existent_target'),
+                ])
+
+    @with_check_app(inherit_check_fail_fast=True)
+    def test_check_fail_fast(self, app, status, warning):
+        """
+        .. inherit:: inside index,//non_existent_target
+
+        A paragraph that has no target.
+        """
+        with self.assertRaisesRegex(InheritCheckError, 'non_existent_target'):
+            app.builder.build_all()
+
+    @with_app(
+        buildername='inherit-check',
+        confoverrides={'inherit_check_fail_fast': True},
+        srcdir='tests/doc/content/',
+        write_docstring='module/index.rst')
+    def test_check_fail_fast_pattern(self, app, status, warning):
+        """
+        .. inherit:: inside *,//section[@names=='list']
+
+        A paragraph for the one document with the section.
+        """
+        app.builder.build_all()
+        self.assertEqual(read_check_result(app), {'problems': []})
+
+
+class TestInheritSkipFragmentDocuments(TestCase):
+
+    @with_app(
+        confoverrides={'inherit_skip_fragment_documents': True},
+        srcdir='tests/doc/basic/',
+        write_docstring='module/index.rst')
+    def test_skip_fragment_documents(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='tests']
+
+        A paragraph that is inherited.
+        """
+        # The builder's write is only wrapped once
+        write = app.builder.write
+        skip_written_documents(app)
+        self.assertIs(app.builder.write, write)
+
+        app.builder.build_all()
+        self.assertIn('module/index', app.env.inherit_fragments)
+        self.assertTrue((app.outdir / 'index.html').exists())
+        self.assertFalse((app.outdir / 'module' / 'index.html').exists())
+        search_index = (app.outdir / 'searchindex.js').read_text(
+            encoding='utf-8')
+        self.assertNotIn('module/index', search_index)
+
+
+class TestInheritSkipUnchangedDocuments(TestCase):
+
+    @with_app(
+        buildername='html',
+        confoverrides={'inherit_skip_unchanged_documents': True},
+        srcdir='tests/doc/content/',
+        warningiserror=True,
+        write_docstring='module/index.rst')
+    def test_skip_unchanged_documents(self, app, status, warning):
+        """
+        .. inherit:: inside list,//section[@names=='list']
+
+        A paragraph that is inherited.
+        """
+        app.build(True)
+
+        def rebuild(text):
+            change_document(app, text)
+            builder = type(app.builder)
+            with patch.object(
+                    builder, 'write_doc', autospec=True,
+                    side_effect=builder.write_doc) as write_doc:
+                app.build(False)
+            return {c.args[1] for c in write_doc.call_args_list}
+
+        text = (app.srcdir / 'module' / 'index.rst').read_text(
+            encoding='utf-8')
+        written = rebuild(text + '\n')
+        self.assertIn('list', app.env.inherit_unchanged_docnames)
+        self.assertNotIn('list', written)
+        self.assertIn('module/index', written)
+
+        written = rebuild(text.replace('is inherited', 'has changed'))
+        self.assertIn('list', written)
+        source = (app.outdir / 'list.html').read_text(encoding='utf-8')
+        self.assertIn('A paragraph that has changed', source)
@@ -0,0 +1,210 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from docpath.docpath import Docpath
+from docutils import nodes
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from sphinx_testing import with_tmpdir
+from unittest import TestCase
+from unittest.mock import patch
+
+import sphinxcontrib.inherit.costs
+import sphinxcontrib.inherit.engine
+import sphinxcontrib.inherit.nodes
+import sphinxcontrib.inherit.query
+
+sizes = [8, 16, 32]
+
+conf = """
+extensions = ['sphinxcontrib.inherit']
+master_doc = 'index'
+inherit_modules_dir = 'modules'
+inherit_modules = {modules!r}
+"""
+
+target = """
+Target {i}
+==========
+
+A paragraph in target {i}.
+
+.. _target-{i}-label:
+
+Labelled {i}
+------------
+
+A paragraph in the labelled section of target {i}.
+
+Hidden {i}
+----------
+
+A paragraph that is hidden.
+"""
+
+module = """
+Module {i}
+##########
+
+.. inherit:: after label:target-{i}-label
+    :quantity: 2
+
+A first paragraph after the label from module {i}.
+
+A second paragraph after the label from module {i}.
+
+.. inherit:: hide target{i},//section[@names=='hidden {i}']
+
+.. inherit:: inside target{i},//section[@names=='target {i}']
+
+Inherited {i}
+-------------
+
+A paragraph inherited from module {i}.
+
+* an item inherited from module {i}
+"""
+
+
+def write_project(srcdir, size):
+    modules = ['m{}'.format(i) for i in range(size)]
+    srcdir.mkdir()
+    (srcdir / 'conf.py').write_text(conf.format(modules=modules))
+    (srcdir / 'index.rst').write_text('Index\n=====\n')
+    for i, name in enumerate(modules):
+        (srcdir / 'target{}.rst'.format(i)).write_text(target.format(i=i))
+        module_dir = srcdir / 'modules' / name
+        module_dir.mkdir(parents=True)
+        (module_dir / 'index.rst').write_text(module.format(i=i))
+
+
+counts = Counter()
+
+
+class CountingEntries:
+    "Count the entries that are looked through"
+
+    def items(self):
+        for item in super().items():
+            counts['registry_entries'] += 1
+            yield item
+
+    def keys(self):
+        return (k for k, _ in self.items())
+
+    def values(self):
+        return (v for _, v in self.items())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+class CountingDict(CountingEntries, dict):
+    pass
+
+
+class CountingRegistry(CountingEntries, defaultdict):
+    "A registry whose entries, and whose entries' entries, are counted"
+
+    def __init__(self, default_factory=None, *args, **kwargs):
+        if default_factory is dict:
+            default_factory = CountingDict
+        super().__init__(default_factory, *args, **kwargs)
+
+
+findall = Docpath.findall
+copy = nodes.Element.copy
+insert = nodes.Element.insert
+iter_tree = sphinxcontrib.inherit.nodes.iter_tree
+find_label = sphinxcontrib.inherit.query.LabelQuery.find
+
+
+def counting_findall(path, from_node):
+    counts['docpath_evaluations'] += 1
+    for node in findall(path, from_node):
+        counts['nodes_visited'] += 1
+        yield node
+
+
+def counting_find_label(query, index):
+    counts['label_lookups'] += 1
+    return find_label(query, index)
+
+
+def counting_copy(node):
+    counts['copied_nodes'] += 1
+    return copy(node)
+
+
+def counting_insert(node, index, item):
+    counts['insertions'] += 1
+    return insert(node, index, item)
+
+
+def counting_iter_tree(node):
+    for descendant in iter_tree(node):
+        counts['nodes_visited'] += 1
+        yield descendant
+
+
+def counting_patches():
+    yield patch.object(Docpath, 'findall', counting_findall)
+    yield patch.object(nodes.Element, 'copy', counting_copy)
+    yield patch.object(nodes.Element, 'insert', counting_insert)
+    yield patch.object(
+        sphinxcontrib.inherit.query.LabelQuery, 'find', counting_find_label)
+    yield patch(
+        'sphinxcontrib.inherit.engine.defaultdict', CountingRegistry)
+    for module in [
+            sphinxcontrib.inherit.costs, sphinxcontrib.inherit.engine,
+            sphinxcontrib.inherit.nodes, sphinxcontrib.inherit.query]:
+        yield patch.object(module, 'iter_tree', counting_iter_tree)
+
+
+def count_operations(tmpdir, size):
+    "Count the operations done to build and then purge a synthetic project"
+    srcdir = Path(tmpdir) / 'project{}'.format(size)
+    write_project(srcdir, size)
+    counts.clear()
+    with docutils_namespace(), ExitStack() as stack:
+        app = Sphinx(
+            str(srcdir), str(srcdir), str(srcdir / '_build'),
+            str(srcdir / '_build' / '.doctrees'), 'inherit-check',
+            status=None, warning=None)
+        for counting_patch in counting_patches():
+            stack.enter_context(counting_patch)
+
+        app.build(True)
+
+        # Every inherit must have been applied
+        applied = app.env.inherit_applied
+        assert len(applied) == size
+        assert all(len(a) == 3 for a in applied.values())
+
+        for docname in sorted(app.env.found_docs):
+            app.emit('env-purge-doc', app.env, docname)
+
+    return Counter(counts)
+
+
+class TestInheritComplexity(TestCase):
+
+    @with_tmpdir
+    def test_operations_grow_linearly(self, tmpdir):
+        "Test the work done grows linearly with the documents and inherits."
+        counts = {size: count_operations(tmpdir, size) for size in sizes}
+
+        operations = [
+            'docpath_evaluations', 'nodes_visited', 'copied_nodes',
+            'insertions', 'registry_entries', 'label_lookups']
+        smallest, largest = sizes[0], sizes[-1]
+        for operation in operations:
+            self.assertGreater(counts[smallest][operation], 0, operation)
+            # Allow a little slack for any work that is done per build
+            self.assertLessEqual(
+                counts[largest][operation] / largest,
+                1.25 * counts[smallest][operation] / smallest,
+                (operation, {s: counts[s][operation] for s in sizes}))
@@ -0,0 +1,49 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import csv
+
+from sphinx_testing import with_app
+from unittest import TestCase
+
+
+def read_cost_report(app):
+    filename = app.outdir / 'inherit-costs.csv'
+    with open(filename, 'r', encoding='utf-8', newline='') as file:
+        return {row['module']: row for row in csv.DictReader(file)}
+
+
+class TestInheritCosts(TestCase):
+
+    @with_app(
+        confoverrides={
+            'exclude_patterns': [],
+            'inherit_cost_report': True,
+            'inherit_modules': ['module1', 'module2'],
+            },
+        srcdir='tests/doc/modules/',
+        warningiserror=True)
+    def test_cost_report(self, app, status, warning):
+        "Test the costs of each module are reported."
+        app.build(True)
+        report = read_cost_report(app)
+        self.assertEqual(sorted(report), ['', 'module1', 'module2'])
+
+        for module in ['module1', 'module2']:
+            self.assertEqual(report[module]['documents'], '1')
+            self.assertEqual(report[module]['fragments'], '1')
+            self.assertEqual(report[module]['targets'], '1')
+            self.assertGreater(float(report[module]['read_seconds']), 0)
+            self.assertGreater(float(report[module]['apply_seconds']), 0)
+            self.assertGreater(int(report[module]['fragment_nodes']), 0)
+            self.assertGreater(int(report[module]['fragment_bytes']), 0)
+
+        self.assertEqual(report['']['documents'], '1')
+        self.assertEqual(report['']['fragments'], '0')
+        self.assertEqual(report['']['targets'], '0')
+
+    @with_app(srcdir='tests/doc/modules/')
+    def test_no_cost_report(self, app, status, warning):
+        "Test the costs are not reported unless asked for."
+        app.build(True)
+        self.assertFalse((app.outdir / 'inherit-costs.csv').exists())
@@ -1,8 +1,15 @@
 # This file is part of the sphinxcontrib-inherit extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+import os
+
+from itertools import chain
 from sphinx_testing import with_app
+from sphinxcontrib.inherit.query import DocpathQuery
 from unittest import TestCase
+from unittest.mock import patch
+
+from .utils import change_document
 
 
 def with_basic_app(warnings=''):
@@ -73,6 +80,22 @@ class TestInheritDirectivePosition(TestCase):
         source = (app.outdir / 'index.html').read_text(encoding='utf-8')
         self.assertNotRegex(source, r'<h2>Tests')
 
+    @with_app(
+        buildername='pseudoxml',
+        confoverrides={'inherit_prune_hidden': True},
+        srcdir='tests/doc/basic',
+        warningiserror=True,
+        write_docstring='module/index.rst')
+    def test_inherit_hide_pruned(self, app, status, warning):
+        """
+        .. inherit:: hide //section[@names=='tests']
+        """
+        app.builder.build_all()
+        source = (app.outdir / 'index.pseudoxml').read_text(encoding='utf-8')
+        self.assertNotRegex(source, r'inherit_hidden')
+        self.assertNotRegex(source, r'Tests')
+        self.assertNotIn('tests', app.env.get_doctree('index').ids)
+
 
 class TestInheritDirectiveOptions(TestCase):
 
@@ -130,6 +153,24 @@ class TestInheritDirectiveOptions(TestCase):
         self.assertNotRegex(source, r'Subsection One')
         self.assertNotRegex(source, r'Subsection Two')
 
+    @with_basic_app()
+    def test_inherit_filter_nested(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='tests']
+            :filter: .//section
+
+        Section
+        -------
+
+        Subsection
+        ^^^^^^^^^^
+
+        A paragraph in the subsection.
+        """
+        app.builder.build_all()
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertEqual(source.count('A paragraph in the subsection.'), 1)
+
     @with_content_app()
     def test_inherit_index_start(self, app, status, warning):
         """
@@ -213,6 +254,38 @@ class TestInheritDirectiveOptions(TestCase):
             r'<li><p>third list item</p></li>\s*'
             r'<li><p>fourth list item</p></li>\s*</ul>')
 
+    @with_content_app()
+    def test_inherit_scope(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='tests']
+            :scope: lis*
+
+        A paragraph that is only inherited by the list document.
+        """
+        app.builder.build_all()
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertEqual(
+            source.count('A paragraph that is only inherited'), 1)
+        self.assertRegex(
+            source,
+            r'(?ms)<li><p>fourth list item</p></li>\s*</ul>\s*'
+            r'</(div|section)>\s*'
+            r'<p>A paragraph that is only inherited[^<]*</p>')
+
+    @with_content_app()
+    def test_inherit_label_target(self, app, status, warning):
+        """
+        .. inherit:: inside label:list-label
+
+        A paragraph inserted using a label.
+        """
+        app.builder.build_all()
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(
+            source,
+            r'(?ms)<li><p>fourth list item</p></li>\s*</ul>\s*'
+            r'<p>A paragraph inserted using a label\.</p>')
+
     @with_content_app('html')
     def test_inherit_toctree_insertion(self, app, status, warning):
         """
@@ -546,3 +619,219 @@ class TestInheritDirectiveNodeTypes(TestCase):
         self.assertRegex(
             warning.getvalue(),
             r'(?ms)Error in "inherit" directive:\sno content permitted\.')
+
+
+class TestInheritReleaseFragments(TestCase):
+
+    @with_app(
+        confoverrides={'inherit_release_fragments': True},
+        srcdir='tests/doc/basic',
+        warningiserror=True,
+        write_docstring='module/index.rst')
+    def test_inherit_release_fragments(self, app, status, warning):
+        """
+        .. inherit:: inside index,//section[@names=='tests']
+
+        A paragraph that is released.
+
+        .. inherit:: after //section[@names=='tests']
+
+        A paragraph that is kept.
+        """
+        app.builder.build_all()
+        released, kept = sorted(
+            (n for d, n in chain(*app.env.inherit_nodes.values())),
+            key=lambda n: n['source'])
+        self.assertEqual(len(released.children), 0)
+        self.assertTrue(os.path.isfile(released._released_to))
+        self.assertEqual(len(kept.children), 1)
+
+        change_document(app, None, 'index')
+        app.build(False)
+
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(source, r'A paragraph that is released')
+        self.assertEqual(len(released.children), 0)
+
+
+class TestInheritCacheTargetLocations(TestCase):
+
+    @with_app(
+        confoverrides={'inherit_cache_target_locations': True},
+        srcdir='tests/doc/basic',
+        warningiserror=True,
+        write_docstring='module/index.rst')
+    def test_inherit_cache_target_locations(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='tests']
+
+        A paragraph that is inherited.
+
+        .. inherit:: after //section[@names=='tests']/paragraph
+
+        A paragraph after the inherited paragraph.
+        """
+        app.build(True)
+        self.assertIn(None, app.env.inherit_locations['module/index'].values())
+
+        def rebuild(text):
+            change_document(app, text, 'index')
+            with patch.object(
+                    DocpathQuery, 'find', autospec=True,
+                    side_effect=DocpathQuery.find) as find:
+                app.build(False)
+            source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+            self.assertRegex(
+                source, r'(?s)A paragraph that is inherited.*'
+                r'A paragraph after the inherited paragraph')
+            return find.call_count
+
+        text = (app.srcdir / 'index.rst').read_text(encoding='utf-8')
+        self.assertEqual(rebuild(text), 0)
+        self.assertEqual(
+            rebuild(text + '\nOther\n=====\n\nA new paragraph.\n'), 1)
+
+
+class TestInheritUnappliedNodes(TestCase):
+
+    @with_basic_app('allow-warnings')
+    def test_inherit_unapplied_updated_incrementally(
+            self, app, status, warning):
+        """
+        .. inherit:: inside index,//section[@names=='later']
+
+        A paragraph for a section that is added later.
+        """
+        app.build(True)
+        node, = app.env.inherit_unapplied
+        self.assertRegex(warning.getvalue(), r'inherit not applied')
+
+        def rebuild(text):
+            change_document(app, text, 'index')
+            warning.truncate(0)
+            app.build(False)
+
+        text = (app.srcdir / 'index.rst').read_text(encoding='utf-8')
+        rebuild(text + '\nLater\n=====\n')
+        self.assertEqual(app.env.inherit_unapplied, set())
+        self.assertEqual(app.env.inherit_applied_counts, {node: 1})
+        self.assertNotRegex(warning.getvalue(), r'inherit not applied')
+
+        rebuild(text)
+        self.assertEqual(app.env.inherit_unapplied, {node})
+        self.assertEqual(app.env.inherit_applied_counts, {node: 0})
+        self.assertRegex(warning.getvalue(), r'inherit not applied')
+
+
+class TestInheritDependencies(TestCase):
+
+    @with_basic_app('allow-warnings')
+    def test_inherit_dependency_cycle(self, app, status, warning):
+        """
+        .. inherit:: inside //section[@names=='cycle b']
+
+        Cycle A
+        -------
+
+        A paragraph in the first section of the cycle.
+
+        .. inherit:: inside //section[@names=='cycle a']
+
+        Cycle B
+        -------
+
+        A paragraph in the second section of the cycle.
+        """
+        app.builder.build_all()
+        self.assertRegex(
+            warning.getvalue(),
+            r"inherit target '//section\[@names=='cycle b'\]' depends on a "
+            r"cycle of inherits")
+        self.assertRegex(
+            warning.getvalue(),
+            r"inherit target '//section\[@names=='cycle a'\]' depends on a "
+            r"cycle of inherits")
+
+
+class TestInheritHideDocument(TestCase):
+
+    @with_content_app(buildername='html')
+    def test_inherit_hide_document(self, app, status, warning):
+        """
+        .. inherit:: hide document:list
+        """
+        app.build(True)
+        self.assertNotIn('list', app.env.found_docs)
+        self.assertNotIn('list', app.env.all_docs)
+        self.assertIn(
+            "document 'list' is hidden by 'module/index'", status.getvalue())
+        self.assertFalse((app.outdir / 'list.html').exists())
+
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertNotIn('list.html', source)
+        self.assertIn('paragraph.html', source)
+
+        # Showing the document again re-reads the documents that include it
+        change_document(app, '\n')
+        app.build(False)
+
+        self.assertIn('list', app.env.found_docs)
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertIn('list.html', source)
+
+
+    @with_app(
+        buildername='html',
+        srcdir='tests/doc/content/',
+        write_docstring='module/index.rst')
+    def test_inherit_hide_document_nested(self, app, status, warning):
+        """
+        * A list item.
+
+          .. inherit:: hide document:list
+        """
+        app.build(True)
+        self.assertIn('list', app.env.found_docs)
+        self.assertRegex(
+            warning.getvalue(),
+            r"module/index.rst:\d+: WARNING: document-level hides must not "
+            r"be nested")
+
+class TestInheritFanOut(TestCase):
+
+    @with_content_app(buildername='html')
+    def test_inherit_docname_pattern(self, app, status, warning):
+        """
+        .. inherit:: inside *,//section[@names=='tests']
+
+        A paragraph inherited by every top-level document.
+        """
+        app.build(True)
+        self.assertEqual(
+            sum(len(n) for n in app.env.inherit_nodes.values()), 1)
+        for docname in ['index', 'list', 'paragraph']:
+            source = (app.outdir / (docname + '.html')).read_text(
+                encoding='utf-8')
+            self.assertEqual(
+                source.count('A paragraph inherited by every'), 1, docname)
+
+        source = (app.outdir / 'module' / 'index.html').read_text(
+            encoding='utf-8')
+        self.assertNotIn('A paragraph inherited by every', source)
+
+    @with_content_app(buildername='html')
+    def test_inherit_every(self, app, status, warning):
+        """
+        .. inherit:: after paragraph,//section[@names=='paragraphs']/paragraph
+            :every:
+
+        A paragraph after every paragraph.
+        """
+        app.build(True)
+        source = (app.outdir / 'paragraph.html').read_text(encoding='utf-8')
+        self.assertEqual(source.count('A paragraph after every paragraph'), 4)
+        self.assertRegex(
+            source,
+            r'(?ms)<p>The first paragraph\.</p>\s*'
+            r'<p>A paragraph after every paragraph\.</p>\s*'
+            r'<p>The second paragraph\.</p>')
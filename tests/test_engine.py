@@ -0,0 +1,178 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import path as docpath
+from sphinxcontrib.inherit.engine import dependency_order, publish_doctrees
+from unittest import TestCase
+
+sources = {
+    'index': """
+Index
+=====
+
+A paragraph in the index.
+
+First Section
+-------------
+
+A paragraph in the first section.
+""",
+    'modules/first/index': """
+.. inherit:: after //section[@names=='first section']
+
+Second Section
+--------------
+
+A paragraph from the first module, with a footnote [#note]_.
+
+.. [#note] A footnote from the first module.
+""",
+    'modules/second/index': """
+.. inherit:: inside //section[@names=='first section']
+
+A paragraph from the second module.
+
+.. inherit:: after //section[@names=='missing section']
+
+A paragraph that is never applied.
+""",
+    'modules/disabled/index': """
+.. inherit:: inside //section[@names=='first section']
+
+A paragraph from a disabled module.
+""",
+    }
+
+chained_sources = {
+    'index': """
+Index
+=====
+
+A paragraph in the index.
+""",
+    'modules/first/index': """
+.. inherit:: inside //section[@names=='index']
+    :quantity: 2
+
+.. _added-section:
+
+Added Section
+-------------
+
+A paragraph from the first module.
+""",
+    'modules/second/index': """
+.. inherit:: inside label:added-section
+
+A paragraph from the second module.
+
+.. inherit:: after //section[@names=='added section']/paragraph
+
+A paragraph after the paragraph from the first module.
+""",
+    }
+
+child_sources = {
+    'index': """
+Index
+=====
+
+A paragraph in the index.
+""",
+    'modules/first/index': """
+.. inherit:: inside //section[./bullet_list]
+
+A paragraph in the section with a list.
+""",
+    'modules/second/index': """
+.. inherit:: inside //section[@names=='index']
+
+* an item added by the second module
+""",
+    }
+
+
+def paragraphs(document):
+    return [p.astext() for p in docpath('//paragraph').findall(document)]
+
+
+class TestInheritEngine(TestCase):
+
+    def publish(self, **kwargs):
+        return publish_doctrees(
+            sources, modules=['first', 'second'], modules_dir='modules',
+            settings_overrides={'report_level': 5}, **kwargs)
+
+    def test_publish_doctrees(self):
+        "Test inherits are applied to doctrees read without Sphinx."
+        result = self.publish(parallel=False)
+
+        self.assertNotIn('modules/disabled/index', result.doctrees)
+        self.assertEqual(
+            paragraphs(result.doctrees['index']), [
+                'A paragraph in the index.',
+                'A paragraph in the first section.',
+                'A paragraph from the second module.',
+                'A paragraph from the first module, with a footnote 1.',
+                'A footnote from the first module.',
+                ])
+        self.assertEqual(
+            len(result.doctrees['modules/second/index'].children), 0)
+
+        footnote_reference, = docpath('//footnote_reference').findall(
+            result.doctrees['index'])
+        self.assertTrue(footnote_reference['refid'])
+
+        unapplied, = result.unapplied
+        self.assertEqual(
+            unapplied['target'], "//section[@names=='missing section']")
+
+    def test_publish_doctrees_in_batches(self):
+        "Test doctrees read in batches across processes are the same."
+        serial = self.publish(parallel=False)
+        parallel = self.publish(parallel=True, batch_size=1)
+        self.assertEqual(
+            {d: t.pformat() for d, t in parallel.doctrees.items()},
+            {d: t.pformat() for d, t in serial.doctrees.items()})
+        self.assertEqual(
+            [n['source'] for n in parallel.unapplied],
+            [n['source'] for n in serial.unapplied])
+
+    def test_publish_chained_inherits(self):
+        "Test inherits into nodes added by other inherits in any order."
+        for modules in [['first', 'second'], ['second', 'first']]:
+            result = publish_doctrees(
+                chained_sources, modules=modules, modules_dir='modules',
+                parallel=False, settings_overrides={'report_level': 5})
+            self.assertEqual(
+                paragraphs(result.doctrees['index']), [
+                    'A paragraph in the index.',
+                    'A paragraph from the first module.',
+                    'A paragraph after the paragraph from the first module.',
+                    'A paragraph from the second module.',
+                    ], modules)
+            self.assertEqual(result.unapplied, [])
+
+    def test_publish_child_type_inherits(self):
+        "Test inherits into nodes given a child by other inherits."
+        for modules in [['first', 'second'], ['second', 'first']]:
+            result = publish_doctrees(
+                child_sources, modules=modules, modules_dir='modules',
+                parallel=False, settings_overrides={'report_level': 5})
+            self.assertEqual(
+                paragraphs(result.doctrees['index']), [
+                    'A paragraph in the index.',
+                    'an item added by the second module',
+                    'A paragraph in the section with a list.',
+                    ], modules)
+            self.assertEqual(result.unapplied, [])
+
+    def test_dependency_order(self):
+        "Test keys are sorted after the keys they depend on."
+        self.assertEqual(
+            dependency_order(['a', 'b', 'c', 'd'], {'a': {'c'}, 'b': {'a'}}),
+            (['c', 'a', 'b', 'd'], []))
+        self.assertEqual(
+            dependency_order(
+                ['a', 'b', 'c', 'd'], {'a': {'b'}, 'b': {'a'}, 'c': {'b'}}),
+            (['d', 'a', 'b', 'c'], ['a', 'b', 'c']))
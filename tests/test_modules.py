@@ -96,3 +96,27 @@ class TestInheritModules(TestCase):
             source,
             r'(?ms)<h3>Module One Test.*</h3>.*'
             r'<h3>Module Two Test.*</h3>')
+
+    @with_modular_app({'inherit_modules': ['module1']})
+    def test_disabled_modules_not_found(self, app, status, warning):
+        "Test documents in disabled modules are never discovered."
+        app.builder.build_all()
+        self.assertIn('module1/index', app.env.found_docs)
+        self.assertNotIn('module2/index', app.env.found_docs)
+        self.assertNotIn('module2', app.config.exclude_patterns)
+
+    @with_app(
+        confoverrides={
+            'exclude_patterns': [], 'inherit_modules': ['module1'],
+            'source_suffix': ['.rst', '.txt']},
+        srcdir='tests/doc/modules/', copy_srcdir_to_tmpdir=True)
+    def test_discovery_warnings_kept(self, app, status, warning):
+        "Test Sphinx still warns about documents with several source files."
+        for suffix in ['.rst', '.txt']:
+            (app.srcdir / 'module1' / ('other' + suffix)).write_text(
+                'Other\n=====\n', encoding='utf-8')
+        app.builder.build_all()
+        self.assertIn(
+            'multiple files found for the document "module1/other"',
+            warning.getvalue())
+        self.assertNotIn('module2/index', app.env.found_docs)
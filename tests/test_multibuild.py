@@ -0,0 +1,52 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from pathlib import Path
+from shutil import copytree
+from sphinx_testing import with_tmpdir
+from sphinxcontrib.inherit.multibuild import build
+from unittest import TestCase
+
+from .utils import recording_parses
+
+module = """
+.. inherit:: inside index,//section[@names=='tests']
+
+A paragraph that is inherited.
+"""
+
+
+def copy_basic_doc(tmpdir):
+    srcdir = Path(tmpdir) / 'basic'
+    copytree('tests/doc/basic', str(srcdir))
+    (srcdir / 'module' / 'index.rst').write_text(module, encoding='utf-8')
+    return srcdir
+
+
+class TestInheritMultiBuild(TestCase):
+
+    @with_tmpdir
+    def test_build_serial(self, tmpdir):
+        "Test the documents are only read once for all the builders."
+        srcdir = copy_basic_doc(tmpdir)
+        with recording_parses() as parsed:
+            statuscodes = build(
+                srcdir, tmpdir / 'build', ['html', 'text'], parallel=False)
+
+        self.assertEqual(statuscodes, {'html': 0, 'text': 0})
+        self.assertEqual(sorted(parsed), ['index', 'module/index'])
+        source = (Path(tmpdir) / 'build' / 'text' / 'index.txt').read_text(
+            encoding='utf-8')
+        self.assertRegex(source, r'A paragraph that is inherited')
+
+    @with_tmpdir
+    def test_build_parallel(self, tmpdir):
+        "Test building with each builder in its own process."
+        srcdir = copy_basic_doc(tmpdir)
+        statuscodes = build(srcdir, tmpdir / 'build', ['html', 'text'])
+
+        self.assertEqual(statuscodes, {'html': 0, 'text': 0})
+        for filename in ['html/index.html', 'text/index.txt']:
+            source = (Path(tmpdir) / 'build' / filename).read_text(
+                encoding='utf-8')
+            self.assertRegex(source, r'A paragraph that is inherited')
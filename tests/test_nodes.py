@@ -0,0 +1,88 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import sys
+
+from docutils import nodes
+from sphinx import addnodes
+from sphinx_testing import with_tmpdir
+from sphinxcontrib.inherit.nodes import clone_nodes, inherit, iter_tree
+from unittest import TestCase
+
+
+def deep_fragment(depth):
+    # Build from the bottom up, as appending looks through every ancestor
+    fragment = nodes.paragraph(text='A paragraph at the bottom.')
+    for i in reversed(range(depth)):
+        fragment = nodes.container('', fragment, ids=['c{}'.format(i)])
+    return fragment
+
+
+def describe(node):
+    if isinstance(node, nodes.Text):
+        return str(node)
+    return (node.tagname, node['ids'])
+
+
+class TestCloneNodes(TestCase):
+
+    def test_clone_nodes(self):
+        "Test the clones are equal to, but do not share nodes with, the nodes."
+        fragment = [
+            nodes.paragraph(text='A paragraph.'),
+            nodes.bullet_list('', nodes.list_item(
+                '', nodes.paragraph(text='An item.'), ids=['item']))]
+        clones = clone_nodes(fragment)
+
+        self.assertEqual(
+            [c.pformat() for c in clones], [n.pformat() for n in fragment])
+        originals = {id(n) for f in fragment for n in iter_tree(f)}
+        self.assertFalse(
+            any(id(n) in originals for c in clones for n in iter_tree(c)))
+        self.assertTrue(all(c.parent is None for c in clones))
+
+        clones[1][0]['ids'].append('changed')
+        self.assertEqual(fragment[1][0]['ids'], ['item'])
+
+    def test_clone_deep_nodes(self):
+        "Test nodes nested deeper than the recursion limit can be cloned."
+        fragment = deep_fragment(sys.getrecursionlimit() * 2)
+        clone, = clone_nodes([fragment])
+        self.assertEqual(
+            [describe(n) for n in iter_tree(clone)],
+            [describe(n) for n in iter_tree(fragment)])
+
+
+class TestInheritNode(TestCase):
+
+    def test_instantiate(self):
+        "Test each instance is a new copy of the nodes to be inherited."
+        node = inherit(index=1)
+        node.extend([nodes.paragraph(text='A paragraph.'), addnodes.toctree()])
+        first, second = node.instantiate(), node.instantiate()
+
+        self.assertEqual(
+            [n.pformat() for n in first], [n.pformat() for n in second])
+        self.assertIsNot(first[0], second[0])
+        self.assertIsNot(first[0], node[0])
+        self.assertEqual(first[1]['inherit_index'], 1)
+        self.assertNotIn('inherit_index', node[1])
+
+    @with_tmpdir
+    def test_release(self, tmpdir):
+        "Test released nodes are moved out, and later instances are loaded."
+        node = inherit()
+        paragraph = nodes.paragraph(text='A paragraph.')
+        node.append(paragraph)
+
+        released = node.release(str(tmpdir / 'fragment.pickle'))
+        self.assertEqual(released, [paragraph])
+        self.assertIsNone(paragraph.parent)
+        self.assertEqual(len(node.children), 0)
+
+        instance, = node.instantiate()
+        self.assertIsNot(instance, paragraph)
+        self.assertEqual(instance.pformat(), paragraph.pformat())
+
+        node.discard()
+        self.assertFalse((tmpdir / 'fragment.pickle').exists())
@@ -0,0 +1,60 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from unittest import TestCase
+
+from .utils import change_document, recording_parses, with_copied_basic_app
+
+
+class TestInheritParsers(TestCase):
+
+    @with_copied_basic_app(inherit_cache_parsed_doctrees=True)
+    def test_replay_parsed_doctree(self, app, status, warning):
+        "Test unchanged documents are not parsed again when re-read."
+        change_document(app, """
+            .. inherit:: inside index,//section[@names=='tests']
+
+            A first paragraph.
+            """)
+        app.build(False)
+        self.assertTrue(
+            (app.doctreedir / 'inherit' / 'index.pickle').exists())
+
+        change_document(app, """
+            .. inherit:: inside index,//section[@names=='tests']
+
+            A second paragraph.
+            """)
+        with recording_parses() as parsed:
+            app.build(False)
+
+        self.assertEqual(parsed, ['module/index'])
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertNotRegex(source, r'A first paragraph')
+        self.assertRegex(source, r'(?ms)<h2>Tests.*A second paragraph')
+
+    @with_copied_basic_app(inherit_cache_parsed_doctrees=True)
+    def test_domain_data_not_replayed(self, app, status, warning):
+        "Test documents that add to the domains' data are parsed again."
+        module = """
+            A paragraph.
+
+            .. versionadded:: 1.0
+
+               A change.
+            """
+        index = app.srcdir / 'index.rst'
+        index.write_text(
+            index.read_text(encoding='utf-8') +
+            '\n.. versionadded:: 1.0\n\n   A change.\n', encoding='utf-8')
+        change_document(app, module)
+        app.build(False)
+
+        for build in range(2):
+            change_document(app, module)
+            with recording_parses() as parsed:
+                app.build(False)
+            self.assertEqual(parsed, ['module/index'])
+            changes = app.env.domaindata['changeset']['changes']['1.0']
+            self.assertEqual(
+                sorted(c.docname for c in changes), ['index', 'module/index'])
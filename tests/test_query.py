@@ -0,0 +1,148 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import path as docpath
+from docutils import nodes
+from docutils.core import publish_doctree
+from sphinxcontrib.inherit.query import (
+    DocpathQuery, DocumentIndex, IndexQuery, LabelQuery, compile_query,
+    next_node_after_any_target_nodes)
+from unittest import TestCase
+from unittest.mock import patch
+
+import sphinxcontrib.inherit.query
+
+source = """
+Title
+=====
+
+Section One
+-----------
+
+A paragraph in section one.
+
+.. _a-label:
+
+Section Two
+-----------
+
+* first list item
+* second list item
+
+.. compound::
+
+    A paragraph in a compound.
+
+.. compound::
+
+    .. note::
+
+        A note in a compound.
+"""
+
+paths = [
+    "//section",
+    "//*",
+    "//section[@names=='section one']",
+    "//section[@names == \"section two\"]",
+    "//*[@ids=='section-two']",
+    "//*[@names=='a-label']",
+    "//target[@ids=='a-label']",
+    "//paragraph[@names=='section one']",
+    "//section[@names=='missing']",
+    "//compound[./note]",
+    "//compound[./paragraph]",
+    "//*[./list_item]",
+    "//non_existent_node",
+    ]
+
+
+class TestInheritQuery(TestCase):
+
+    def setUp(self):
+        self.document = publish_doctree(source)
+        self.index = DocumentIndex(self.document)
+
+    def test_common_paths_use_index(self):
+        "Test common paths are answered using the document index."
+        for path in paths:
+            self.assertIsInstance(compile_query(path), IndexQuery)
+
+    def test_other_paths_use_docpath(self):
+        "Test other paths fall back to evaluating the docpath."
+        self.assertIsInstance(
+            compile_query('//bullet_list/list_item[2]'), DocpathQuery)
+        self.assertIsInstance(
+            compile_query("//section[@names=='x']/paragraph"), DocpathQuery)
+
+    def test_index_matches_docpath(self):
+        "Test the document index finds the same nodes as docpath."
+        for path in paths:
+            self.assertIs(
+                compile_query(path).find(self.index),
+                docpath(path).find(self.document), path)
+
+    def test_index_find_all_matches_docpath(self):
+        "Test the document index finds every node that docpath finds."
+        for path in paths + ['//bullet_list/list_item']:
+            self.assertEqual(
+                compile_query(path).find_all(self.index),
+                list(docpath(path).findall(self.document)), path)
+
+    def test_label(self):
+        "Test finding the node that a label refers to."
+        query = compile_query('label:A-Label')
+        self.assertIsInstance(query, LabelQuery)
+        self.assertIs(
+            query.find(self.index),
+            docpath("//section[@names=='section two a-label']").find(
+                self.document))
+        self.assertIsNone(compile_query('label:section one').find(self.index))
+
+    def test_index_invalidate(self):
+        "Test the document index is rebuilt after being invalidated."
+        query = compile_query("//section[@names=='section one']")
+        section = query.find(self.index)
+        section.parent.remove(section)
+        self.index.invalidate()
+        self.assertIsNone(query.find(self.index))
+
+    def test_index_single_walk(self):
+        "Test the queries of an index are all answered with one walk."
+        queries = [compile_query(path) for path in paths]
+        index = DocumentIndex(self.document, queries)
+        with patch.object(
+                sphinxcontrib.inherit.query, 'iter_tree',
+                wraps=sphinxcontrib.inherit.query.iter_tree) as iter_tree:
+            for path, query in zip(paths, queries):
+                self.assertIs(
+                    query.find(index), docpath(path).find(self.document),
+                    path)
+        self.assertEqual(iter_tree.call_count, 1)
+
+    def test_index_note_changed(self):
+        "Test the index is only invalidated by nodes that match its queries."
+        query = compile_query("//paragraph[@names=='inserted']")
+        index = DocumentIndex(self.document, [query])
+        self.assertIsNone(query.find(index))
+
+        index.note_changed([nodes.paragraph(names=['other'])])
+        self.assertIsNotNone(index._matches)
+
+        inserted = nodes.paragraph(names=['inserted'])
+        section = nodes.section('', inserted)
+        self.document.append(section)
+        index.note_changed([section])
+        self.assertIs(query.find(index), inserted)
+
+        index.done(query)
+        index.note_changed([nodes.paragraph(names=['inserted'])])
+        self.assertIsNotNone(index._matches)
+
+    def test_next_node_after_any_target_nodes(self):
+        "Test finding the next node matches the equivalent docpath."
+        path = docpath(
+            '(descendant_or_self::node|following::node)[name() != target]')
+        for node in docpath('//*').findall(self.document):
+            self.assertIs(
+                next_node_after_any_target_nodes(node), path.find(node))
@@ -0,0 +1,89 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from sphinxcontrib.inherit.scanner import (
+    ScannedInherit, hidden_document, scan_document, scan_lines)
+from textwrap import dedent
+from unittest import TestCase
+
+from .utils import change_document, with_copied_basic_app
+
+
+class TestInheritScanner(TestCase):
+
+    @with_copied_basic_app()
+    def test_scan_document(self, app, status, warning):
+        "Test finding the inherits in a document without parsing it."
+        change_document(app, """
+            .. inherit:: inside index,//section[@names=='tests']
+
+            A paragraph.
+
+                .. inherit:: after   label:some-label
+                    :quantity: 2
+
+            .. include:: other.rst
+            """)
+        scan = scan_document(app.env, 'module/index')
+        self.assertEqual(scan.inherits, [
+            ScannedInherit(
+                2, 'inside', "index,//section[@names=='tests']", 0),
+            ScannedInherit(6, 'after', 'label:some-label', 4),
+            ])
+        self.assertTrue(scan.includes)
+        self.assertIs(scan_document(app.env, 'module/index'), scan)
+
+        self.assertEqual(scan_document(app.env, 'index').inherits, [])
+        self.assertFalse(scan_document(app.env, 'index').includes)
+
+    def test_scan_skips_literal_text(self):
+        "Test inherits in literal blocks and comments are not scanned."
+        inherits, includes = scan_lines(dedent("""
+            An example::
+
+                .. inherit:: hide document:literal
+
+            .. code-block:: rst
+
+                .. inherit:: hide document:code
+
+            ..
+                .. inherit:: hide document:comment
+
+            .. note::
+
+                .. inherit:: hide document:indented
+
+            .. inherit:: hide document:hidden
+            """).splitlines())
+        self.assertEqual(
+            [(i.target, i.indent) for i in inherits],
+            [('document:indented', 4), ('document:hidden', 0)])
+        self.assertEqual(
+            list(filter(None, map(hidden_document, inherits))), ['hidden'])
+
+    @with_copied_basic_app()
+    def test_read_new_target(self, app, status, warning):
+        "Test the documents targeted by changed inherits are read again."
+        app.build(False)
+        change_document(app, """
+            .. inherit:: inside index,//section[@names=='tests']
+
+            A paragraph that is added later.
+            """)
+        app.build(False)
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(source, r'A paragraph that is added later')
+
+    @with_copied_basic_app()
+    def test_validate(self, app, status, warning):
+        "Test invalid inherits are reported before they are parsed."
+        change_document(app, """
+            .. inherit:: inside missing,//section[@names=='tests']
+
+            A paragraph for a missing document.
+            """)
+        app.build(False)
+        self.assertRegex(
+            warning.getvalue(),
+            r"module/index.rst:2: WARNING: inherit target document 'missing'")
@@ -0,0 +1,98 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import pickle
+
+from pathlib import Path
+from shutil import copytree
+from sphinx_testing import with_tmpdir
+from sphinxcontrib.inherit.multibuild import build_one
+from unittest import TestCase
+
+from .utils import recording_parses
+
+
+def read_doctree(doctreedir, docname):
+    with open(str(Path(doctreedir) / (docname + '.doctree')), 'rb') as file:
+        return pickle.load(file)
+
+
+def build(srcdir, outdir, builder, **confoverrides):
+    doctreedir = str(Path(outdir) / '.doctrees')
+    statuscode = build_one(
+        builder, str(srcdir), str(srcdir), str(outdir), doctreedir,
+        confoverrides)
+    return statuscode, doctreedir
+
+
+def written_pages(outdir):
+    return sorted(
+        str(p.relative_to(outdir)) for p in Path(outdir).glob('**/*.html'))
+
+
+class TestInheritShards(TestCase):
+
+    @with_tmpdir
+    def test_replayed_shards_match_serial_build(self, tmpdir):
+        "Test replaying the doctrees from shards matches a serial build."
+        srcdir = Path(tmpdir) / 'modules'
+        copytree('tests/doc/modules', str(srcdir))
+        (srcdir / 'other.rst').write_text(
+            'Other\n=====\n\nA document outside the modules.\n',
+            encoding='utf-8')
+        (srcdir / 'module1' / 'page.rst').write_text(
+            'Page\n====\n\nA page of module1.\n', encoding='utf-8')
+        build_dir = Path(tmpdir) / 'build'
+
+        shards = []
+        for module in ['module1', 'module2']:
+            statuscode, doctreedir = build(
+                srcdir, build_dir / module, 'inherit-shard',
+                inherit_modules=[module])
+            self.assertEqual(statuscode, 0)
+            shard = build_dir / module / 'inherit-shard'
+            shard /= 'inherit-shard.pickle'
+            self.assertTrue(shard.exists())
+            self.assertTrue(
+                (Path(doctreedir) / module / 'index.doctree').exists())
+            self.assertFalse((Path(doctreedir) / 'other.doctree').exists())
+            shards.append(str(shard))
+
+        docnames = ['index', 'module1/index', 'module1/page', 'module2/index']
+        for modules in [['module1', 'module2'], ['module2', 'module1']]:
+            name = '-'.join(modules)
+            serial_outdir = build_dir / 'serial' / name
+            statuscode, serial_doctreedir = build(
+                srcdir, serial_outdir, 'html', inherit_modules=modules)
+            self.assertEqual(statuscode, 0)
+            sharded_outdir = build_dir / 'sharded' / name
+            with recording_parses() as parsed:
+                statuscode, sharded_doctreedir = build(
+                    srcdir, sharded_outdir, 'html',
+                    inherit_modules=modules, inherit_shards=shards)
+            self.assertEqual(statuscode, 0)
+            self.assertEqual(parsed, ['other'])
+
+            for docname in docnames:
+                self.assertEqual(
+                    read_doctree(sharded_doctreedir, docname).pformat(),
+                    read_doctree(serial_doctreedir, docname).pformat(),
+                    (modules, docname))
+            self.assertEqual(
+                written_pages(sharded_outdir / 'html'),
+                written_pages(serial_outdir / 'html'))
+            self.assertIn(
+                'module1/page.html', written_pages(sharded_outdir / 'html'))
+
+        # A document that changed since the shard was built is parsed again
+        (srcdir / 'module1' / 'page.rst').write_text(
+            'Page\n====\n\nA changed page of module1.\n', encoding='utf-8')
+        with recording_parses() as parsed:
+            statuscode, sharded_doctreedir = build(
+                srcdir, sharded_outdir, 'html',
+                inherit_modules=modules, inherit_shards=shards)
+        self.assertEqual(statuscode, 0)
+        self.assertEqual(parsed, ['module1/page'])
+        self.assertIn(
+            'A changed page',
+            read_doctree(sharded_doctreedir, 'module1/page').astext())
@@ -0,0 +1,56 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from sphinxcontrib.inherit.engine import unapplied_inherit_nodes
+from sphinxcontrib.inherit.watch import Watcher
+from unittest import TestCase
+
+from .utils import change_document, with_copied_basic_app
+
+
+class TestInheritWatcher(TestCase):
+
+    @with_copied_basic_app()
+    def test_poll(self, app, status, warning):
+        "Test polling for changed source files."
+        watcher = Watcher(app)
+        self.assertEqual(watcher.poll(), set())
+        change_document(app, "")
+        self.assertEqual(watcher.poll(), {'module/index.rst'})
+        self.assertEqual(watcher.poll(), set())
+
+    @with_copied_basic_app()
+    def test_rebuild_new_target(self, app, status, warning):
+        "Test a new inherit is applied to a target that has not changed."
+        app.build(False)
+        watcher = Watcher(app)
+        change_document(app, """
+            .. inherit:: inside index,//section[@names=='tests']
+
+            A paragraph that is added while watching.
+            """)
+        watcher.rebuild(watcher.poll())
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(source, r'A paragraph that is added while watching')
+
+        change_document(app, "")
+        watcher.rebuild(watcher.poll())
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertNotRegex(
+            source, r'A paragraph that is added while watching')
+
+    @with_copied_basic_app()
+    def test_rebuild_new_docname_less_target(self, app, status, warning):
+        "Test a new inherit without a target document is applied."
+        app.build(False)
+        watcher = Watcher(app)
+        change_document(app, """
+            .. inherit:: inside //section[@names=='tests']
+
+            A paragraph that is added to any document while watching.
+            """)
+        watcher.rebuild(watcher.poll())
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(
+            source, r'A paragraph that is added to any document while')
+        self.assertEqual(unapplied_inherit_nodes(app.env), [])
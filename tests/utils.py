@@ -0,0 +1,45 @@
+# This file is part of the sphinxcontrib-inherit extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+import time
+
+from contextlib import contextmanager
+from sphinx.parsers import RSTParser
+from sphinx_testing import with_app
+from textwrap import dedent
+from unittest.mock import patch
+
+
+def with_copied_basic_app(**confoverrides):
+    "Build a copy of the basic documentation, with the overridden config"
+    return with_app(
+        confoverrides=confoverrides,
+        srcdir='tests/doc/basic/',
+        copy_srcdir_to_tmpdir=True)
+
+
+def change_document(app, text, docname='module/index'):
+    """
+    Rewrite the document, or only touch it when the text is None, so the
+    next build sees it as changed
+    """
+    filename = app.srcdir / (docname + '.rst')
+    if text is not None:
+        filename.write_text(dedent(text), encoding='utf-8')
+    mtime = max(time.time(), os.stat(filename).st_mtime) + 10
+    os.utime(filename, (mtime, mtime))
+
+
+@contextmanager
+def recording_parses():
+    "Record the name of each document that is parsed, in a list"
+    parsed = []
+    parse = RSTParser.parse
+
+    def record_parse(parser, inputstring, document):
+        parsed.append(document.settings.env.docname)
+        return parse(parser, inputstring, document)
+
+    with patch.object(RSTParser, 'parse', record_parse):
+        yield parsed